@@ -0,0 +1,120 @@
+"""Vazão do carregador: download do servidor falso, normalização e codificação.
+
+Mede ``load_data_from_sheets()`` (melhor e mediana de ``--repeat``) com o app apontado
+para ``fake_sheets.py`` e, em seguida, a primeira carga completa do snapshot
+(``snapshot_cache.preload()``: carga, gravação do arquivo e estruturas
+derivadas), com o tempo de cada etapa lido das métricas do app.
+
+Uso: python benchmarks/bench_loader.py [--rows 100000] [--repeat 3] [--json]
+
+Roda em um processo próprio por tamanho (``run_suite.py`` faz isso) para que o
+pico de memória reportado seja só o desta carga.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+from fake_sheets import serve  # noqa: E402
+from synthetic import cached_csv  # noqa: E402
+
+
+def histogram_totals(histogram):
+    """``{valor do rótulo: (soma, contagem)}`` de um histograma de um rótulo"""
+    totals = {}
+    for suffix, _, key, value in histogram.samples():
+        if suffix in ('_sum', '_count'):
+            total = totals.setdefault(key[0], [0.0, 0])
+            total[0 if suffix == '_sum' else 1] = value
+    return {name: tuple(total) for name, total in totals.items()}
+
+
+def run(rows, repeat):
+    with open(cached_csv(rows), 'r', encoding='utf-8') as file:
+        csv_text = file.read()
+    server = serve(csv_text)
+    csv_bytes = len(server.csv_body)
+    del csv_text
+
+    directory = tempfile.mkdtemp(prefix='bench-loader-')
+    os.environ['GOOGLE_SHEETS_URLS'] = server.url('export')
+    os.environ['SNAPSHOT_PATH'] = os.path.join(directory, 'snapshot.bin')
+    import main
+    from metrics import LOADER_STAGE, SNAPSHOT_BUILD
+
+    times = []
+    for _ in range(repeat):
+        # Sem isso a segunda carga seria um 304 (conteúdo igual ao aceito)
+        main.sheets_fetcher.forget()
+        start = time.perf_counter()
+        data, source = main.load_data_from_sheets()
+        elapsed = time.perf_counter() - start
+        if source != 'sheets':
+            raise RuntimeError('O servidor falso não respondeu; o app usou o CSV local')
+        times.append(elapsed)
+        del data
+    stages = {stage: total / count for stage, (total, count) in histogram_totals(LOADER_STAGE).items()}
+
+    main.sheets_fetcher.forget()
+    start = time.perf_counter()
+    snapshot = main.snapshot_cache.preload()
+    first_load = time.perf_counter() - start
+    builders = {builder: total for builder, (total, _) in histogram_totals(SNAPSHOT_BUILD).items()}
+    persist = histogram_totals(LOADER_STAGE).get('persist', (0.0, 0))[0]
+    server.shutdown()
+    best = min(times)
+
+    return {
+        'rows': len(snapshot.data),
+        'csv_mb': round(csv_bytes / 1e6, 2),
+        'load_seconds': round(best, 4),
+        'load_seconds_median': round(statistics.median(times), 4),
+        'rows_per_second': round(len(snapshot.data) / best),
+        'mb_per_second': round(csv_bytes / 1e6 / best, 2),
+        # Médias por carga; "fetch" é só o download (normalize e encode vêm depois)
+        'stage_seconds': {stage: round(value, 4) for stage, value in sorted(stages.items()) if stage != 'persist'},
+        'first_load_seconds': round(first_load, 4),
+        'persist_seconds': round(persist, 4),
+        'build_seconds': {builder: round(value, 4) for builder, value in builders.items()},
+        'snapshot_mb': round(os.path.getsize(os.environ['SNAPSHOT_PATH']) / 1e6, 2),
+        # ru_maxrss é em KB no Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='imprime só o resultado em JSON (stdout)')
+    args = parser.parse_args()
+
+    if args.json:
+        # Os prints do app vão para stderr para não misturar com o JSON
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        result = run(args.rows, args.repeat)
+        sys.stdout = stdout
+        print(json.dumps(result))
+        return
+
+    result = run(args.rows, args.repeat)
+    print(f"\n{result['rows']:,} linhas, CSV de {result['csv_mb']} MB")
+    print(f"load_data_from_sheets  {result['load_seconds']:8.3f}s  {result['rows_per_second']:>10,} linhas/s  "
+          f"{result['mb_per_second']:6.1f} MB/s  (mediana {result['load_seconds_median']:.3f}s)")
+    for stage, seconds in result['stage_seconds'].items():
+        print(f"  {stage:<20} {seconds:8.3f}s")
+    print(f"primeira carga completa {result['first_load_seconds']:7.3f}s  (gravação {result['persist_seconds']:.3f}s)")
+    for builder, seconds in result['build_seconds'].items():
+        print(f"  {builder:<20} {seconds:8.3f}s")
+    print(f"snapshot em disco {result['snapshot_mb']} MB, pico de memória {result['peak_rss_mb']} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Compara a normalização em colunas com os laços por linha anteriores.
+
+Uso: python benchmarks/bench_normalize.py [--rows 100000] [--repeat 3]
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from normalize import normalize_csv  # noqa: E402
+from synthetic import generate_csv  # noqa: E402
+
+
+def legacy_clean_numeric_value(value):
+    """Cópia de ``clean_numeric_value`` antes da normalização em colunas"""
+    if not value or str(value).lower() in ['não tem analytics', 'n/a', 'nan', '']:
+        return 'N/A'
+    str_value = str(value).strip()
+    import re
+    cleaned = re.sub(r'[^\d.,]', '', str_value)
+    cleaned = cleaned.replace(',', '.')
+    try:
+        num_value = float(cleaned)
+        if num_value.is_integer():
+            return int(num_value)
+        return num_value
+    except:  # noqa: E722
+        return 'N/A'
+
+
+def legacy_load(csv_text):
+    """Cópia do laço por linha de ``load_data_from_sheets`` antes da normalização em colunas"""
+    reader = csv.DictReader(io.StringIO(csv_text))
+    data = []
+    for row in reader:
+        clean_row = {}
+        nome_options = ['Nome do veículo.\n', 'Nome do veículo', 'Nome']
+        nome_value = 'N/A'
+        for nome_col in nome_options:
+            if nome_col in row and row[nome_col]:
+                nome_value = row[nome_col]
+                break
+        clean_row['Nome do veículo'] = nome_value
+        clean_row['Cidade'] = row.get('Cidade', 'N/A')
+        clean_row['Status'] = row.get('Status', 'N/A')
+        clean_row['Categoria'] = row.get('Categoria', 'N/A')
+        clean_row['Cookies'] = row.get('Cookies', 'N/A')
+        clean_row['Expediente'] = row.get('Expediente', 'N/A')
+        clean_row['Endereço'] = row.get('Endereço no site', row.get('Endereço', 'N/A'))
+        clean_row['Analytics'] = row.get('Google analytics ', row.get('Analytics', 'N/A'))
+        clean_row['Views Set'] = legacy_clean_numeric_value(row.get('Views Setembro', '0'))
+        clean_row['Views Out'] = legacy_clean_numeric_value(row.get('Views Outubro', '0'))
+        clean_row['Views Nov'] = legacy_clean_numeric_value(row.get('Views Novembro', '0'))
+        clean_row['Média Trimestral'] = legacy_clean_numeric_value(row.get('Média Trimestral', '0'))
+        clean_row['Views Ago'] = legacy_clean_numeric_value(row.get('Views Novembro', '0'))
+        if clean_row['Nome do veículo'] != 'N/A' and clean_row['Nome do veículo'].strip():
+            data.append(clean_row)
+    return data
+
+
+def best_time(function, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    csv_text = generate_csv(args.rows)
+    print(f"CSV sintético: {args.rows} linhas, {len(csv_text) / 1e6:.1f} MB")
+
+    cases = [
+        ('laço por linha (anterior)', lambda: legacy_load(csv_text)),
+        ('normalize_csv (colunas)', lambda: normalize_csv(csv_text)),
+        ('normalize_csv + records()', lambda: normalize_csv(csv_text).records()),
+    ]
+    baseline = None
+    for label, function in cases:
+        elapsed, result = best_time(function, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{label:<28} {elapsed:8.3f}s  {len(result) / elapsed:>10,.0f} linhas/s  {baseline / elapsed:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
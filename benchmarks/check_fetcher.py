@@ -0,0 +1,120 @@
+"""Verifica ``SheetsFetcher.race`` contra o servidor falso em cada modo de falha.
+
+Cada cenário usa um ``SheetsFetcher`` novo apontado para ``fake_sheets.py`` e
+confere o resultado, o tempo gasto e as estatísticas das URLs:
+
+- HTML, corpo vazio e HTTP 500 são descartados e a próxima URL assume na hora
+- uma URL lenta é ultrapassada pela seguinte depois de ``hedge_delay``
+- sem resposta dentro de ``deadline``, a corrida desiste no prazo
+- a conversão do CSV vencedor não conta no prazo de download
+- uma conversão que falha passa a vez para as outras URLs
+- um conteúdo igual ao aceito volta como ``not_modified``, sem conversão
+- três falhas seguidas abrem o circuito e a URL deixa de ser consultada
+
+Uso: python benchmarks/check_fetcher.py
+
+Sai com código 1 se alguma verificação falhar.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+from fake_sheets import serve  # noqa: E402
+from synthetic import generate_csv  # noqa: E402
+
+# O app só é importado pelo validador do CSV; sem URLs e com snapshot temporário
+os.environ['GOOGLE_SHEETS_URLS'] = ''
+os.environ.setdefault('SNAPSHOT_PATH', os.path.join(tempfile.mkdtemp(prefix='check-fetcher-'), 'snapshot.bin'))
+from main import validate_sheets_csv  # noqa: E402
+from sheets_fetcher import CIRCUIT_THRESHOLD, SheetsFetcher  # noqa: E402
+
+# Folga para a latência do servidor local nas comparações de tempo
+SLACK = 1.0
+
+failures = []
+
+
+def check(name, condition, detail=''):
+    print(f"{'ok   ' if condition else 'FALHA'} {name}{f' ({detail})' if detail else ''}")
+    if not condition:
+        failures.append(name)
+
+
+def run_race(server, paths, parse=lambda result: len(result.text), fetcher=None, **options):
+    """``(resultado da corrida, segundos, fetcher)`` com os prints do fetcher silenciados"""
+    fetcher = fetcher or SheetsFetcher([server.url(path) for path in paths], timeout=10)
+    start = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):
+        outcome = fetcher.race(parse, validate=validate_sheets_csv, **options)
+    return outcome, time.monotonic() - start, fetcher
+
+
+def main():
+    server = serve(generate_csv(200))
+
+    outcome, elapsed, fetcher = run_race(server, ['html', 'empty', 'status/500', 'export'], hedge_delay=5)
+    stats = fetcher.stats()
+    check('falhas passam para a próxima URL sem esperar o hedge',
+          outcome is not None and outcome[0].url == server.url('export') and elapsed < SLACK, f'{elapsed:.2f}s')
+    check('HTML, vazio e 500 contam como falha',
+          all(stats[server.url(path)]['failures'] == 1 for path in ('html', 'empty', 'status/500')),
+          ', '.join(str(stats[server.url(path)]['last_error']) for path in ('html', 'empty', 'status/500')))
+
+    outcome, elapsed, _ = run_race(server, ['slow/3', 'export'], hedge_delay=0.3)
+    check('URL lenta é ultrapassada depois do hedge',
+          outcome is not None and outcome[0].url == server.url('export') and elapsed < 0.3 + SLACK, f'{elapsed:.2f}s')
+
+    outcome, elapsed, _ = run_race(server, ['slow/5'], deadline=1)
+    check('desiste no prazo sem resposta', outcome is None and elapsed < 1 + SLACK, f'{elapsed:.2f}s')
+
+    def slow_parse(result):
+        time.sleep(1.5)
+        return len(result.text)
+
+    outcome, elapsed, _ = run_race(server, ['export'], parse=slow_parse, deadline=1)
+    check('conversão fica fora do prazo de download', outcome is not None, f'{elapsed:.2f}s')
+
+    rejected = []
+
+    def reject_first(result):
+        if not rejected:
+            rejected.append(result.url)
+            raise ValueError('CSV sem registros')
+        return len(result.text)
+
+    outcome, _, fetcher = run_race(server, ['export', 'slow/0.2'], parse=reject_first, hedge_delay=5)
+    check('conversão com erro passa a vez para a próxima URL',
+          outcome is not None and outcome[0].url == server.url('slow/0.2')
+          and fetcher.stats()[server.url('export')]['failures'] == 1)
+
+    _, _, fetcher = run_race(server, ['export'])
+    outcome, _, _ = run_race(server, ['export'], fetcher=fetcher)
+    check('conteúdo igual ao aceito volta sem conversão',
+          outcome is not None and outcome[0].not_modified and outcome[1] is None)
+
+    url = server.url('status/503')
+    fetcher = SheetsFetcher([url], timeout=5)
+    for _ in range(CIRCUIT_THRESHOLD):
+        run_race(server, [], fetcher=fetcher)
+    hits = server.hits.get('/status/503', 0)
+    outcome, elapsed, _ = run_race(server, [], fetcher=fetcher)
+    check(f'circuito abre depois de {CIRCUIT_THRESHOLD} falhas seguidas',
+          fetcher.stats()[url]['circuit_open'] and outcome is None
+          and server.hits.get('/status/503', 0) == hits == CIRCUIT_THRESHOLD,
+          f'{hits} requisições')
+
+    server.shutdown()
+    if failures:
+        print(f'{len(failures)} verificação(ões) falharam')
+        sys.exit(1)
+    print('Todas as verificações passaram')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Compara dois resultados de ``run_suite.py`` (ex.: antes e depois de um commit).
+
+Uso: python benchmarks/compare.py results/antes.json results/depois.json [--threshold 10] [--fail-over 25]
+
+Mostra as métricas presentes nos dois arquivos com a variação percentual;
+variações acima de ``--threshold`` são marcadas como melhora ou piora. Com
+``--fail-over``, sai com código 1 se alguma métrica piorar mais que isso (para CI).
+"""
+import argparse
+import json
+import sys
+
+# Sufixo da métrica -> maior é melhor?
+DIRECTIONS = {
+    '_seconds': False,
+    '_seconds_median': False,
+    '_ms': False,
+    '_mb': False,
+    'rps': True,
+    'rows_per_second': True,
+    'mb_per_second': True,
+}
+# Métricas de contexto, não de desempenho
+IGNORED = {'rows', 'csv_mb', 'requests', 'errors', 'rejected', 'kb_per_response', 'max_ms', 'snapshot_mb'}
+
+
+def flatten(value, prefix=''):
+    """``{caminho: número}`` das folhas numéricas (listas são ignoradas)"""
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(flatten(child, f'{prefix}/{key}' if prefix else str(key)))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def direction(path):
+    """Se maior é melhor, pelo nome da métrica ou do grupo (ex.: ``build_seconds/search``)"""
+    parts = path.split('/')
+    if parts[-1] in IGNORED:
+        return None
+    for part in reversed(parts):
+        for suffix, higher_is_better in DIRECTIONS.items():
+            if part.endswith(suffix):
+                return higher_is_better
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10, help='variação (%%) para marcar melhora/piora')
+    parser.add_argument('--fail-over', type=float, help='sai com erro se alguma métrica piorar mais que isso (%%)')
+    parser.add_argument('--all', action='store_true', help='mostra também as métricas sem variação relevante')
+    args = parser.parse_args()
+
+    with open(args.before, 'r', encoding='utf-8') as file:
+        before = json.load(file)
+    with open(args.after, 'r', encoding='utf-8') as file:
+        after = json.load(file)
+    print(f"antes:  {before['commit'][:10]}{' (com alterações)' if before.get('dirty') else ''} {before['started_at']}")
+    print(f"depois: {after['commit'][:10]}{' (com alterações)' if after.get('dirty') else ''} {after['started_at']}")
+    if before.get('settings') != after.get('settings') or before.get('machine') != after.get('machine'):
+        print('Atenção: configurações ou máquinas diferentes; a comparação pode não ser justa')
+
+    old = flatten(before['sizes'])
+    new = flatten(after['sizes'])
+    worst = 0.0
+    for path in [path for path in old if path in new]:
+        higher_is_better = direction(path)
+        if higher_is_better is None or not old[path]:
+            continue
+        change = 100 * (new[path] - old[path]) / old[path]
+        worse = -change if higher_is_better else change
+        worst = max(worst, worse)
+        mark = ''
+        if worse > args.threshold:
+            mark = 'PIORA'
+        elif worse < -args.threshold:
+            mark = 'melhora'
+        if mark or args.all:
+            print(f'{path:<80} {old[path]:>12} -> {new[path]:>12}  {change:+7.1f}%  {mark}')
+
+    missing = sorted(set(old) ^ set(new))
+    if missing:
+        print(f'{len(missing)} métricas só em um dos arquivos (rotas ou tamanhos diferentes)')
+    if args.fail_over is not None and worst > args.fail_over:
+        print(f'Piora máxima de {worst:.1f}% acima do limite de {args.fail_over}%')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Servidor HTTP local que imita a exportação CSV do Google Sheets.
+
+Serve um CSV sintético (ou um arquivo) com ETag e 304, e caminhos que injetam
+as falhas vistas na prática:
+
+- ``/export``: o CSV
+- ``/slow/<segundos>``: o CSV depois de uma espera
+- ``/html``: página HTML de erro com status 200 (como a tela de login do Google)
+- ``/empty``: corpo vazio
+- ``/status/<código>``: resposta com o código HTTP pedido
+
+Uso: python benchmarks/fake_sheets.py [--port 8765] [--rows 1000 | --csv arquivo.csv]
+
+Para apontar o app para ele::
+
+    GOOGLE_SHEETS_URLS=http://127.0.0.1:8765/slow/5,http://127.0.0.1:8765/html,http://127.0.0.1:8765/export \\
+        python src/main.py
+"""
+import argparse
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import generate_csv
+
+HTML_ERROR = b'<!DOCTYPE html><html><head><title>Google Drive - Acesso negado</title></head><body></body></html>'
+
+
+class FakeSheetsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        route = parts[0] if parts else ''
+        if route == 'export':
+            self._send_csv()
+        elif route == 'slow' and len(parts) > 1:
+            time.sleep(float(parts[1]))
+            self._send_csv()
+        elif route == 'html':
+            self._send(200, HTML_ERROR, 'text/html; charset=utf-8')
+        elif route == 'empty':
+            self._send(200, b'', 'text/csv')
+        elif route == 'status' and len(parts) > 1:
+            self._send(int(parts[1]), b'', 'text/plain')
+        else:
+            self._send(404, b'', 'text/plain')
+
+    def _send_csv(self):
+        body = self.server.csv_body
+        etag = self.server.etag
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send(200, body, 'text/csv; charset=utf-8', {'ETag': etag})
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSheetsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, csv_text):
+        super().__init__(address, FakeSheetsHandler)
+        self.hits = {}
+        self.set_csv(csv_text)
+
+    def set_csv(self, csv_text):
+        """Troca o conteúdo servido (simula uma edição na planilha)"""
+        self.csv_body = csv_text.encode('utf-8')
+        self.etag = '"' + hashlib.sha256(self.csv_body).hexdigest()[:16] + '"'
+
+    def url(self, path):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/{path.lstrip("/")}'
+
+
+def serve(csv_text, port=0):
+    """Inicia o servidor em uma thread e o retorna (``port=0`` escolhe uma porta livre)"""
+    server = FakeSheetsServer(('127.0.0.1', port), csv_text)
+    threading.Thread(target=server.serve_forever, name='fake-sheets', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--csv', help='arquivo CSV a servir no lugar do sintético')
+    args = parser.parse_args()
+    if args.csv:
+        with open(args.csv, 'r', encoding='utf-8') as file:
+            text = file.read()
+    else:
+        text = generate_csv(args.rows)
+    server = FakeSheetsServer(('127.0.0.1', args.port), text)
+    print(f'Servindo {len(text)} bytes em {server.url("export")}')
+    server.serve_forever()
@@ -0,0 +1,379 @@
+"""Suíte de benchmarks e teste de carga contra o app em gunicorn.
+
+Para cada tamanho de CSV sintético (``synthetic.py``, cabeçalho real da
+planilha), servido por ``fake_sheets.py`` no lugar do Google Sheets:
+
+- carregador: ``bench_loader.py`` em um processo próprio (vazão, etapas, pico de memória)
+- partida a frio: tempo até ``/api/meta`` responder com o gunicorn sem arquivo de
+  snapshot (busca na "planilha") e com o arquivo já gravado (deploy comum)
+- memória de cada processo (RSS, PSS e USS de ``/proc/<pid>/smaps_rollup``),
+  antes e depois da carga
+- latência p50/p99 e vazão de cada rota ``/api/*`` com ``--concurrency``
+  clientes simultâneos por ``--duration`` segundos
+
+O resultado vai para ``benchmarks/results/<commit>-<data>.json``; compare duas
+execuções com ``compare.py``.
+
+Uso: python benchmarks/run_suite.py [--sizes 1000,100000,1000000] [--duration 10] [--concurrency 8]
+
+O cliente de carga roda na mesma máquina: em máquinas com poucos núcleos ele
+disputa CPU com o gunicorn, então compare resultados da mesma máquina.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from fake_sheets import serve
+from synthetic import cached_csv
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(REPO_DIR, 'src')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# Rotas medidas; ``{version}`` é trocado pela versão do snapshot. A lista
+# completa de /api/data só é pedida até --full-data-rows linhas (a resposta
+# passa de 100 MB com 1 milhão de linhas).
+ROUTES = [
+    '/api/meta',
+    '/api/data',
+    '/api/data?limit=50&facets=1&sort=-Média Trimestral',
+    '/api/data?cidade=Maceió&status=APROVADO&limit=50',
+    '/api/filters',
+    '/api/stats',
+    '/api/aggregates',
+    '/api/top-trimestral?limit=10',
+    '/api/search?q=portal alagoas&limit=20',
+    '/api/autocomplete?q=trib',
+    '/api/desertos',
+    '/api/sources',
+    '/api/changes?since={version}',
+    '/api/export?format=csv&cidade=Penedo',
+    '/api/report?format=html&cidade=Penedo',
+]
+FULL_DATA_ROUTE = '/api/data'
+HEADERS = {'Accept-Encoding': 'gzip, br'}
+
+
+def git_revision():
+    """``(commit, há alterações não commitadas)``"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido', False
+    return commit, dirty
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def encode_path(path):
+    return quote(path, safe='/?&=,-_.~')
+
+
+def get(port, path, timeout=300):
+    """GET simples: ``(status, corpo, cabeçalhos)``"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', encode_path(path), headers=HEADERS)
+        response = connection.getresponse()
+        return response.status, response.read(), dict(response.getheaders())
+    finally:
+        connection.close()
+
+
+def process_memory(pid):
+    """RSS, PSS e USS (memória só do processo) em MB"""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        'rss_mb': round(fields.get('Rss', 0) / 1024, 1),
+        'pss_mb': round(fields.get('Pss', 0) / 1024, 1),
+        'uss_mb': round((fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)) / 1024, 1),
+    }
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children', 'r') as file:
+            return [int(child) for child in file.read().split()]
+    except OSError:
+        return []
+
+
+def gunicorn_memory(master):
+    """Memória do mestre e de cada worker (Linux; ``None`` em outros sistemas)"""
+    master_memory = process_memory(master)
+    if master_memory is None:
+        return None
+    workers = [process_memory(pid) for pid in child_pids(master)]
+    workers = [memory for memory in workers if memory is not None]
+    return {
+        'master': master_memory,
+        'workers': workers,
+        'worker_pss_mb': round(sum(worker['pss_mb'] for worker in workers) / max(1, len(workers)), 1),
+        'total_pss_mb': round(master_memory['pss_mb'] + sum(worker['pss_mb'] for worker in workers), 1),
+    }
+
+
+class Gunicorn:
+    """O app em gunicorn com a configuração de produção (``src/gunicorn.conf.py``)"""
+
+    def __init__(self, port, env, log_path):
+        self.port = port
+        self.log = open(log_path, 'ab')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app'],
+            cwd=SRC_DIR, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout):
+        """Segundos até ``/api/meta`` responder 200 (desde o início do processo)"""
+        start = time.perf_counter()
+        while time.perf_counter() - start < timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn terminou com código {self.process.returncode}; veja {self.log.name}')
+            try:
+                status, body, _ = get(self.port, '/api/meta', timeout=timeout)
+                if status == 200:
+                    return time.perf_counter() - start, json.loads(body)
+            except OSError:
+                pass
+            time.sleep(0.05)
+        raise RuntimeError(f'gunicorn não respondeu em {timeout}s; veja {self.log.name}')
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def warm_up(port, path, timeout):
+    """Primeira chamada da rota; relatórios respondem 202 até ficarem prontos"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        status, _, headers = get(port, path, timeout=timeout)
+        if status != 202 or time.perf_counter() > deadline:
+            return status
+        time.sleep(float(headers.get('Retry-After', '1')) / 4)
+
+
+def load_route(port, path, concurrency, duration):
+    """Clientes com conexão persistente pedindo ``path`` sem pausa por ``duration`` segundos.
+
+    Respostas 429 (limite de exportações simultâneas) contam como recusadas e
+    ficam fora das latências, assim como os erros.
+    """
+    latencies = []
+    errors = []
+    rejected = []
+    received = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    target = encode_path(path)
+
+    def client():
+        local = []
+        local_errors = 0
+        local_rejected = 0
+        local_bytes = 0
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', target, headers=HEADERS)
+                response = connection.getresponse()
+                body = response.read()
+                elapsed = time.perf_counter() - start
+                if response.status == 429:
+                    local_rejected += 1
+                elif response.status >= 400:
+                    local_errors += 1
+                else:
+                    local.append(elapsed)
+                    local_bytes += len(body)
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors.append(local_errors)
+            rejected.append(local_rejected)
+            received.append(local_bytes)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'rejected': sum(rejected),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        'kb_per_response': round(sum(received) / max(1, len(latencies)) / 1024, 1),
+    }
+
+
+def bench_loader(rows, repeat):
+    completed = subprocess.run([sys.executable, os.path.join(BENCH_DIR, 'bench_loader.py'),
+                                '--rows', str(rows), '--repeat', str(repeat), '--json'],
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f'bench_loader.py falhou:\n{completed.stderr[-2000:]}')
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def bench_size(rows, args, work_dir):
+    result = {}
+    print(f'\n=== {rows:,} linhas ===', flush=True)
+    csv_path = cached_csv(rows)
+
+    print('Carregador...', flush=True)
+    result['loader'] = bench_loader(rows, args.repeat)
+    print(f"  {result['loader']['load_seconds']:.3f}s, {result['loader']['rows_per_second']:,} linhas/s, "
+          f"primeira carga completa {result['loader']['first_load_seconds']:.3f}s", flush=True)
+
+    with open(csv_path, 'r', encoding='utf-8') as file:
+        sheets = serve(file.read())
+    directory = tempfile.mkdtemp(prefix=f'bench-{rows}-', dir=work_dir)
+    port = free_port()
+    env = dict(os.environ,
+               PORT=str(port),
+               WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads),
+               GOOGLE_SHEETS_URLS=sheets.url('export'),
+               SNAPSHOT_PATH=os.path.join(directory, 'snapshot.bin'),
+               # Sem recargas em segundo plano durante a medição
+               REFRESH_INTERVAL='86400',
+               PYTHONUNBUFFERED='1')
+    log_path = os.path.join(directory, 'gunicorn.log')
+
+    try:
+        result['cold_start'] = {}
+        for label in ('sheets', 'snapshot_file'):
+            server = Gunicorn(port, env, log_path)
+            try:
+                seconds, meta = server.wait_ready(args.start_timeout)
+                result['cold_start'][f'{label}_seconds'] = round(seconds, 3)
+                print(f'  partida a frio ({label}): {seconds:.2f}s', flush=True)
+                if label == 'sheets':
+                    continue
+
+                routes = [route.format(version=meta['version']) for route in ROUTES
+                          if route != FULL_DATA_ROUTE or rows <= args.full_data_rows]
+                for route in routes:
+                    status = warm_up(port, route, args.start_timeout)
+                    if status >= 400:
+                        raise RuntimeError(f'{route} respondeu {status} no aquecimento')
+                result['memory_idle'] = gunicorn_memory(server.process.pid)
+
+                result['routes'] = {}
+                for route in routes:
+                    stats = load_route(port, route, args.concurrency, args.duration)
+                    result['routes'][route] = stats
+                    print(f"  {route:<55} p50 {stats['p50_ms']:>9} ms  p99 {stats['p99_ms']:>9} ms  "
+                          f"{stats['rps']:>8} req/s  erros {stats['errors']}  recusadas {stats['rejected']}", flush=True)
+                result['memory_loaded'] = gunicorn_memory(server.process.pid)
+                if result['memory_loaded']:
+                    print(f"  memória por worker (PSS): {result['memory_idle']['worker_pss_mb']} MB em repouso, "
+                          f"{result['memory_loaded']['worker_pss_mb']} MB após a carga", flush=True)
+            finally:
+                server.stop()
+    finally:
+        sheets.shutdown()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='linhas dos CSVs sintéticos')
+    parser.add_argument('--repeat', type=int, default=3, help='repetições da medição do carregador')
+    parser.add_argument('--workers', type=int, default=2, help='WEB_CONCURRENCY do gunicorn')
+    parser.add_argument('--threads', type=int, default=4, help='GUNICORN_THREADS')
+    parser.add_argument('--concurrency', type=int, default=8, help='clientes simultâneos por rota')
+    parser.add_argument('--duration', type=float, default=10, help='segundos de carga por rota')
+    parser.add_argument('--full-data-rows', type=int, default=100000,
+                        help='maior cadastro em que /api/data completo entra no teste de carga')
+    parser.add_argument('--start-timeout', type=float, default=900)
+    parser.add_argument('--output', help='arquivo de resultado (padrão: benchmarks/results/<commit>-<data>.json)')
+    args = parser.parse_args()
+
+    commit, dirty = git_revision()
+    started = datetime.now()
+    results = {
+        'commit': commit,
+        'dirty': dirty,
+        'started_at': started.isoformat(timespec='seconds'),
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'settings': {name: getattr(args, name) for name in
+                     ('repeat', 'workers', 'threads', 'concurrency', 'duration', 'full_data_rows')},
+        'sizes': {},
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{commit[:10]}{'-dirty' if dirty else ''}-{started:%Y%m%d-%H%M%S}.json")
+
+    # Snapshots e logs do gunicorn; mantidos se algo falhar
+    work_dir = tempfile.mkdtemp(prefix='metricasveiculos-bench-')
+    for rows in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        results['sizes'][str(rows)] = bench_size(rows, args, work_dir)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    print(f'\nResultado salvo em {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Geração de CSVs sintéticos com o mesmo cabeçalho da planilha de recadastramento.
+
+Os valores são fictícios (nenhum dado pessoal do cadastro real é copiado),
+mas seguem os formatos encontrados na planilha: números com separador de
+milhar brasileiro, "Não tem analytics", datas do Google Forms etc.
+"""
+import csv
+import io
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+REAL_CSV = os.path.join(SRC_DIR, 'Recadastramento(respostas)-CADASTROS(2).csv')
+# CSVs gerados ficam guardados aqui entre execuções (a geração de 1 milhão de linhas leva ~30s)
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data')
+
+CIDADES = [
+    'Maceió', 'Arapiraca', 'Palmeira dos Índios', 'Rio Largo', 'Penedo', 'União dos Palmares',
+    'São Miguel dos Campos', 'Santana do Ipanema', 'Delmiro Gouveia', 'Coruripe', 'Marechal Deodoro',
+    'Campo Alegre', 'Teotônio Vilela', 'Atalaia', 'Girau do Ponciano', 'Pilar', 'Viçosa', 'Maragogi',
+    'Cidade não encontrada', '',
+]
+STATUS = ['APROVADO', 'APROVADO', 'APROVADO', 'APROVADO PARCIAL', 'REPROVADO', 'APROVADO ']
+CATEGORIAS = ['Menores 10k', '10k a 20k', '20k a 50k', '50k a 100k', '100k a 200k', 'Mais de 200k',
+              'Não tem analytics']
+PALAVRAS = ['Notícias', 'Alagoas', 'Portal', 'Agreste', 'Sertão', 'Tribuna', 'Repórter', 'Jornal',
+            'Hoje', 'Informa', 'Diário', 'Gazeta', 'Correio', 'Voz', 'Folha', 'Rádio', 'TV', 'Web']
+
+
+def read_header():
+    """Cabeçalho real da planilha (inclusive quebras de linha e espaços)"""
+    with open(REAL_CSV, 'r', encoding='utf-8', newline='') as file:
+        return next(csv.reader(file))
+
+
+def format_br(number):
+    """1234567 -> '1.234.567'"""
+    return f'{number:,}'.replace(',', '.')
+
+
+def format_br_decimal(number):
+    """1026.333 -> '1.026,333333'"""
+    integer, decimal = f'{number:.6f}'.split('.')
+    return f'{format_br(int(integer))},{decimal}'
+
+
+def synthetic_rows(count, seed=42):
+    """Gera ``count`` linhas (listas) alinhadas ao cabeçalho real"""
+    rng = random.Random(seed)
+    header = read_header()
+    position = {name: i for i, name in enumerate(header)}
+    start = datetime(2025, 5, 30, 8, 0, 0)
+
+    for i in range(count):
+        row = [''] * len(header)
+        row[0] = (start + timedelta(seconds=37 * i)).strftime('%d/%m/%Y %H:%M:%S')
+        nome = f'{rng.choice(PALAVRAS)} {rng.choice(PALAVRAS)} {i}'
+        row[position['Nome do veículo.\n']] = nome
+        row[position['CNPJ.']] = str(rng.randrange(10 ** 13, 10 ** 14))
+        row[position['URL ativa do veículo.']] = f'https://veiculo{i}.example.com.br'
+        row[position['Cidade']] = rng.choice(CIDADES)
+        row[position['Expediente']] = rng.choice(['Possui', 'Não possui', ''])
+        row[position['Cookies']] = rng.choice(['Possui', 'Não possui'])
+        row[position['Endereço no site']] = rng.choice(['Possui', 'Não possui', f'Rua {rng.choice(PALAVRAS)}, {i}'])
+        row[position['HTTPS']] = rng.choice(['Sim', 'Não'])
+        row[position['Categoria']] = rng.choice(CATEGORIAS)
+        row[position['Status']] = rng.choice(STATUS)
+        row[position['Google analytics ']] = rng.choice(['Sim', 'Não', ''])
+
+        if rng.random() < 0.15:
+            for column in ['Views Setembro', 'Views Outubro', 'Views Novembro', 'Média Trimestral',
+                           'Usuários ativos Setembro', 'Usuários ativos Outubro', 'Usuários ativos Novembro']:
+                row[position[column]] = 'Não tem analytics'
+        else:
+            views = [int(rng.lognormvariate(9, 2)) for _ in range(3)]
+            for column, value in zip(['Views Setembro', 'Views Outubro', 'Views Novembro'], views):
+                row[position[column]] = format_br(value)
+            media = sum(views) / 3
+            row[position['Média Trimestral']] = format_br(int(media)) if media.is_integer() else format_br_decimal(media)
+            for column in ['Usuários ativos Setembro', 'Usuários ativos Outubro', 'Usuários ativos Novembro']:
+                row[position[column]] = format_br(int(rng.lognormvariate(8, 2)))
+        yield row
+
+
+def generate_csv(count, seed=42):
+    """CSV sintético completo como texto"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(read_header())
+    writer.writerows(synthetic_rows(count, seed))
+    return buffer.getvalue()
+
+
+def write_csv(path, count, seed=42):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(read_header())
+        writer.writerows(synthetic_rows(count, seed))
+    return path
+
+
+def cached_csv(count, seed=42):
+    """Caminho de um CSV sintético com ``count`` linhas, gerado só na primeira vez"""
+    path = os.path.join(DATA_DIR, f'synthetic-{count}-{seed}.csv')
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        write_csv(temporary, count, seed)
+        os.replace(temporary, path)
+    return path
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sys.stdout.write(generate_csv(rows))
@@ -1,3 +1,8 @@
+import functools
+import os
+import sys
+import threading
+
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -6,40 +11,196 @@ from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output
 import numpy as np
 
-# Carregar os dados
-df = pd.read_excel('/home/ubuntu/upload/Recadastramento(respostas)(2).xlsx')
-
-# Renomear colunas para facilitar o uso
-df.columns = [
-    'timestamp', 'nome_fantasia', 'razao_social', 'cnpj', 'endereco', 
-    'telefone_empresa', 'email_comercial', 'responsavel_tecnico', 'url', 
-    'relatorio_analytics', 'declaracao_veracidade', 'acesso_analytics', 
-    'modalidade_site', 'telefone_responsavel', 'email_responsavel', 
-    'nome_social', 'cidade', 'expediente', 'cookies', 'endereco_site', 
-    'visualizacoes_junho', 'visualizacoes_julho', 'visualizacoes_agosto', 
-    'categoria', 'modalidade', 'google_analytics', 'propriedade', 'status'
-]
-
-# Limpeza e preparação dos dados
-def clean_numeric_column(col):
-    """Limpa colunas numéricas convertendo strings para números"""
-    if col.dtype == 'object':
-        # Remove caracteres não numéricos e converte para float
-        return pd.to_numeric(col.astype(str).str.replace(r'[^\d.]', '', regex=True), errors='coerce').fillna(0)
-    return col
-
-# Aplicar limpeza nas colunas de visualizações
-df['visualizacoes_junho'] = clean_numeric_column(df['visualizacoes_junho'])
-df['visualizacoes_julho'] = clean_numeric_column(df['visualizacoes_julho'])
-df['visualizacoes_agosto'] = clean_numeric_column(df['visualizacoes_agosto'])
-
-# Calcular total de visualizações
-df['total_visualizacoes'] = df['visualizacoes_junho'] + df['visualizacoes_julho'] + df['visualizacoes_agosto']
-
-# Remover valores nulos das colunas de filtro
-df['cidade'] = df['cidade'].fillna('Não informado')
-df['categoria'] = df['categoria'].fillna('Não informado')
-df['status'] = df['status'].fillna('Não informado')
+# Mesmo snapshot normalizado do app Flask (src/main.py): lido do arquivo salvo
+# e atualizado em segundo plano. No mesmo processo, os dois apps compartilham os dados.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from data_index import normalize_value  # noqa: E402
+from main import snapshot_cache  # noqa: E402
+
+# Coluna do dashboard -> coluna do snapshot normalizado (por nome, ver src/normalize.py);
+# o nome do veículo vem de ``data.names``
+TEXT_FIELDS = {'url': 'URL'}
+FILTER_FIELDS = {'cidade': 'Cidade', 'categoria': 'Categoria', 'status': 'Status'}
+VIEW_FIELDS = {
+    'visualizacoes_setembro': ('Views Set', 'Setembro'),
+    'visualizacoes_outubro': ('Views Out', 'Outubro'),
+    'visualizacoes_novembro': ('Views Nov', 'Novembro'),
+}
+
+FILTER_COLUMNS = list(FILTER_FIELDS)
+MESES = [label for _, label in VIEW_FIELDS.values()]
+VIEW_COLUMNS = list(VIEW_FIELDS)
+COLUNAS_TABELA = ['nome_fantasia', 'cidade', 'categoria', 'status', 'url'] + VIEW_COLUMNS + ['total_visualizacoes']
+
+# Combinações de filtros com resultados (agregados e gráficos) guardados em cache
+CACHE_SIZE = 128
+
+
+def categorical_series(categorical):
+    """Coluna codificada do snapshot como categórica do pandas.
+
+    Os valores passam por ``normalize_value``, como nos filtros do app Flask
+    ('APROVADO ' e 'APROVADO' viram um só; vazios e 'N/A' viram 'Não informado'),
+    e os códigos são remapeados sem percorrer as linhas em Python.
+    """
+    labels = {}
+    remap = np.empty(len(categorical.categories), dtype=np.int32)
+    for code, category in enumerate(categorical.categories):
+        value = normalize_value(category)
+        remap[code] = labels.setdefault('Não informado' if value == 'N/A' else value, len(labels))
+    return pd.Categorical.from_codes(remap[categorical.codes], list(labels))
+
+
+def build_dataframe(data):
+    """DataFrame do dashboard a partir do ``ColumnarData`` do snapshot"""
+    columns = {'nome_fantasia': data.names}
+    for column, source in TEXT_FIELDS.items():
+        categorical = data.categoricals[source]
+        columns[column] = np.asarray(categorical.categories, dtype=object)[categorical.codes]
+    for column, source in FILTER_FIELDS.items():
+        columns[column] = categorical_series(data.categoricals[source])
+    for column, (source, _) in VIEW_FIELDS.items():
+        numeric = data.numerics[source]
+        columns[column] = np.where(numeric.missing, 0.0, numeric.values)
+    df = pd.DataFrame(columns)
+    df['total_visualizacoes'] = df[VIEW_COLUMNS].sum(axis=1)
+    return df
+
+
+def filter_key(cidades, categorias, status):
+    """Chave da combinação de filtros (a ordem de seleção não importa)"""
+    return tuple(tuple(sorted(values)) if values else () for values in (cidades, categorias, status))
+
+
+class FilterEngine:
+    """Máscaras por valor das colunas de filtro e resultados em cache por combinação.
+
+    Cada valor de cidade, categoria e status tem sua máscara booleana
+    pré-calculada; filtrar é combinar máscaras, sem copiar o DataFrame. Os
+    agregados e as figuras de cada combinação ficam em um cache LRU, então
+    repetir uma seleção não recalcula nada.
+    """
+
+    def __init__(self, df, version=None):
+        self.df = df
+        self.version = version
+        self.size = len(df)
+        self.codes = {column: df[column].cat.codes.to_numpy() for column in FILTER_COLUMNS}
+        self.categories = {column: list(df[column].cat.categories) for column in FILTER_COLUMNS}
+        self.masks = {
+            column: {value: self.codes[column] == code for code, value in enumerate(self.categories[column])}
+            for column in FILTER_COLUMNS
+        }
+        self.views = {column: df[column].to_numpy(dtype=float) for column in VIEW_COLUMNS + ['total_visualizacoes']}
+
+        self.positions = functools.lru_cache(maxsize=CACHE_SIZE)(self._positions)
+        self.metrics = functools.lru_cache(maxsize=CACHE_SIZE)(self._metrics)
+        self.figure = functools.lru_cache(maxsize=CACHE_SIZE * len(FIGURES))(self._figure)
+        self.table = functools.lru_cache(maxsize=CACHE_SIZE)(self._table)
+
+    def options(self, column):
+        """Valores presentes de uma coluna de filtro, em ordem alfabética"""
+        counts = np.bincount(self.codes[column], minlength=len(self.categories[column]))
+        return sorted(value for value, count in zip(self.categories[column], counts) if count)
+
+    def _positions(self, key):
+        """Posições das linhas que atendem aos filtros (OU dentro da coluna, E entre colunas)"""
+        selected = None
+        for column, values in zip(FILTER_COLUMNS, key):
+            if not values:
+                continue
+            masks = [self.masks[column][value] for value in values if value in self.masks[column]]
+            mask = np.logical_or.reduce(masks) if masks else np.zeros(self.size, dtype=bool)
+            selected = mask if selected is None else selected & mask
+        return np.arange(self.size) if selected is None else np.flatnonzero(selected)
+
+    def _metrics(self, key):
+        positions = self.positions(key)
+        total_sites = len(positions)
+        sums = {column: self.views[column][positions].sum() for column in VIEW_COLUMNS}
+        return {
+            'total_sites': total_sites,
+            'visualizacoes': [sums[column] for column in VIEW_COLUMNS],
+            'media_vis_site': self.views['total_visualizacoes'][positions].mean() if total_sites > 0 else 0,
+        }
+
+    def _figure(self, name, key):
+        return FIGURES[name](self, key)
+
+    def _table(self, key):
+        rows = self.df.iloc[self.positions(key)[:20]]
+        return rows[COLUNAS_TABELA].to_dict('records')
+
+
+def figure_visualizacoes_mes(engine, key):
+    visualizacoes = engine.metrics(key)['visualizacoes']
+    fig_vis = px.bar(x=MESES, y=visualizacoes, title='Total de Visualizações por Mês',
+                     color=visualizacoes, color_continuous_scale='viridis')
+    fig_vis.update_layout(showlegend=False, xaxis_title='Mês', yaxis_title='Visualizações')
+    return fig_vis
+
+
+def figure_sites_por_cidade(engine, key):
+    positions = engine.positions(key)
+    codes = engine.codes['cidade'][positions]
+    counts = np.bincount(codes, minlength=len(engine.categories['cidade']))
+    # Maiores contagens primeiro; empates pela primeira aparição (como ``value_counts``)
+    first_seen = np.full(len(counts), len(engine.df))
+    np.minimum.at(first_seen, codes, positions)
+    top = [code for code in np.lexsort((first_seen, -counts))[:10] if counts[code] > 0]
+    return px.pie(values=counts[top], names=[engine.categories['cidade'][code] for code in top],
+                  title='Top 10 Cidades por Número de Sites')
+
+
+def figure_categoria_status(engine, key):
+    positions = engine.positions(key)
+    width = max(len(engine.categories['status']), 1)
+    pairs = engine.codes['categoria'][positions].astype(np.int64) * width + engine.codes['status'][positions]
+    counts = np.bincount(pairs, minlength=len(engine.categories['categoria']) * width)
+    present = np.flatnonzero(counts)
+    df_cat_status = pd.DataFrame({
+        'categoria': [engine.categories['categoria'][pair // width] for pair in present],
+        'status': [engine.categories['status'][pair % width] for pair in present],
+        'count': counts[present],
+    })
+    return px.sunburst(df_cat_status, path=['categoria', 'status'], values='count',
+                       title='Distribuição por Categoria e Status')
+
+
+def figure_top_sites(engine, key):
+    positions = engine.positions(key)
+    total = engine.views['total_visualizacoes'][positions]
+    top = positions[np.argsort(-total, kind='stable')[:10]]
+    top_sites = engine.df.iloc[top][['nome_fantasia', 'total_visualizacoes']]
+    fig_top = px.bar(top_sites, x='total_visualizacoes', y='nome_fantasia',
+                     orientation='h', title='Top 10 Sites por Total de Visualizações')
+    fig_top.update_layout(yaxis={'categoryorder': 'total ascending'})
+    return fig_top
+
+
+FIGURES = {
+    'grafico-visualizacoes-mes': figure_visualizacoes_mes,
+    'grafico-sites-por-cidade': figure_sites_por_cidade,
+    'grafico-categoria-status': figure_categoria_status,
+    'grafico-top-sites': figure_top_sites,
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def current_engine():
+    """Engine do snapshot atual; reconstruída (com caches novos) quando a versão muda"""
+    global _engine
+    snapshot = snapshot_cache.get()
+    engine = _engine
+    if engine is None or engine.version != snapshot.version:
+        with _engine_lock:
+            if _engine is None or _engine.version != snapshot.version:
+                _engine = FilterEngine(build_dataframe(snapshot.data), snapshot.version)
+            engine = _engine
+    return engine
 
 # Inicializar o aplicativo Dash
 app = dash.Dash(__name__)
@@ -48,165 +209,124 @@ app = dash.Dash(__name__)
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 
-# Layout do dashboard
-app.layout = html.Div([
-    html.Div([
-        html.H1('Dashboard de Análise de Sites - Recadastramento', 
-                style={'textAlign': 'center', 'color': '#2c3e50', 'marginBottom': 30})
-    ]),
+# Layout do dashboard (montado a cada carga da página, com as opções do snapshot atual)
+def serve_layout():
+    engine = current_engine()
+    return html.Div([
+        html.Div([
+            html.H1('Dashboard de Análise de Sites - Recadastramento', 
+                    style={'textAlign': 'center', 'color': '#2c3e50', 'marginBottom': 30})
+        ]),
     
-    # Seção de filtros
-    html.Div([
-        html.H3('Filtros', style={'color': '#34495e'}),
+        # Seção de filtros
         html.Div([
+            html.H3('Filtros', style={'color': '#34495e'}),
             html.Div([
-                html.Label('Cidade:', style={'fontWeight': 'bold'}),
-                dcc.Dropdown(
-                    id='filtro-cidade',
-                    options=[{'label': i, 'value': i} for i in sorted(df['cidade'].unique()) if pd.notna(i)],
-                    multi=True,
-                    placeholder='Selecione as cidades...',
-                    style={'marginBottom': 10}
-                )
-            ], className='four columns'),
+                html.Div([
+                    html.Label('Cidade:', style={'fontWeight': 'bold'}),
+                    dcc.Dropdown(
+                        id='filtro-cidade',
+                        options=[{'label': i, 'value': i} for i in engine.options('cidade')],
+                        multi=True,
+                        placeholder='Selecione as cidades...',
+                        style={'marginBottom': 10}
+                    )
+                ], className='four columns'),
             
-            html.Div([
-                html.Label('Categoria:', style={'fontWeight': 'bold'}),
-                dcc.Dropdown(
-                    id='filtro-categoria',
-                    options=[{'label': i, 'value': i} for i in sorted(df['categoria'].unique()) if pd.notna(i)],
-                    multi=True,
-                    placeholder='Selecione as categorias...',
-                    style={'marginBottom': 10}
-                )
-            ], className='four columns'),
+                html.Div([
+                    html.Label('Categoria:', style={'fontWeight': 'bold'}),
+                    dcc.Dropdown(
+                        id='filtro-categoria',
+                        options=[{'label': i, 'value': i} for i in engine.options('categoria')],
+                        multi=True,
+                        placeholder='Selecione as categorias...',
+                        style={'marginBottom': 10}
+                    )
+                ], className='four columns'),
             
-            html.Div([
-                html.Label('Status:', style={'fontWeight': 'bold'}),
-                dcc.Dropdown(
-                    id='filtro-status',
-                    options=[{'label': i, 'value': i} for i in sorted(df['status'].unique()) if pd.notna(i)],
-                    multi=True,
-                    placeholder='Selecione os status...',
-                    style={'marginBottom': 10}
-                )
-            ], className='four columns')
-        ], className='row', style={'marginBottom': 20})
-    ], style={'backgroundColor': '#ecf0f1', 'padding': 20, 'marginBottom': 20}),
+                html.Div([
+                    html.Label('Status:', style={'fontWeight': 'bold'}),
+                    dcc.Dropdown(
+                        id='filtro-status',
+                        options=[{'label': i, 'value': i} for i in engine.options('status')],
+                        multi=True,
+                        placeholder='Selecione os status...',
+                        style={'marginBottom': 10}
+                    )
+                ], className='four columns')
+            ], className='row', style={'marginBottom': 20})
+        ], style={'backgroundColor': '#ecf0f1', 'padding': 20, 'marginBottom': 20}),
     
-    # Seção de métricas principais
-    html.Div(id='metricas-principais', style={'marginBottom': 20}),
+        # Seção de métricas principais
+        html.Div(id='metricas-principais', style={'marginBottom': 20}),
     
-    # Seção de gráficos
-    html.Div([
+        # Seção de gráficos
         html.Div([
-            dcc.Graph(id='grafico-visualizacoes-mes')
-        ], className='six columns'),
+            html.Div([
+                dcc.Graph(id='grafico-visualizacoes-mes')
+            ], className='six columns'),
         
-        html.Div([
-            dcc.Graph(id='grafico-sites-por-cidade')
-        ], className='six columns')
-    ], className='row'),
+            html.Div([
+                dcc.Graph(id='grafico-sites-por-cidade')
+            ], className='six columns')
+        ], className='row'),
     
-    html.Div([
         html.Div([
-            dcc.Graph(id='grafico-categoria-status')
-        ], className='six columns'),
+            html.Div([
+                dcc.Graph(id='grafico-categoria-status')
+            ], className='six columns'),
         
-        html.Div([
-            dcc.Graph(id='grafico-top-sites')
-        ], className='six columns')
-    ], className='row'),
-    
-    # Tabela de dados
-    html.Div([
-        html.H3('Dados Detalhados', style={'color': '#34495e'}),
-        html.Div(id='tabela-dados')
-    ], style={'marginTop': 30})
-])
-
-# Callbacks para atualizar os componentes
-@app.callback(
-    [Output('metricas-principais', 'children'),
-     Output('grafico-visualizacoes-mes', 'figure'),
-     Output('grafico-sites-por-cidade', 'figure'),
-     Output('grafico-categoria-status', 'figure'),
-     Output('grafico-top-sites', 'figure'),
-     Output('tabela-dados', 'children')],
-    [Input('filtro-cidade', 'value'),
-     Input('filtro-categoria', 'value'),
-     Input('filtro-status', 'value')]
-)
-def update_dashboard(cidades_selecionadas, categorias_selecionadas, status_selecionado):
-    # Filtrar dados
-    dff = df.copy()
-    
-    if cidades_selecionadas:
-        dff = dff[dff['cidade'].isin(cidades_selecionadas)]
-    if categorias_selecionadas:
-        dff = dff[dff['categoria'].isin(categorias_selecionadas)]
-    if status_selecionado:
-        dff = dff[dff['status'].isin(status_selecionado)]
+            html.Div([
+                dcc.Graph(id='grafico-top-sites')
+            ], className='six columns')
+        ], className='row'),
     
-    # Métricas principais
-    total_sites = len(dff)
-    total_vis_junho = dff['visualizacoes_junho'].sum()
-    total_vis_julho = dff['visualizacoes_julho'].sum()
-    total_vis_agosto = dff['visualizacoes_agosto'].sum()
-    media_vis_site = dff['total_visualizacoes'].mean() if total_sites > 0 else 0
+        # Tabela de dados
+        html.Div([
+            html.H3('Dados Detalhados', style={'color': '#34495e'}),
+            html.Div(id='tabela-dados')
+        ], style={'marginTop': 30})
+    ])
+
+app.layout = serve_layout
+
+# Callbacks separados: cada saída é calculada (ou lida do cache) de forma independente
+FILTER_INPUTS = [Input('filtro-cidade', 'value'),
+                 Input('filtro-categoria', 'value'),
+                 Input('filtro-status', 'value')]
+
+@app.callback(Output('metricas-principais', 'children'), FILTER_INPUTS)
+def update_metricas(cidades_selecionadas, categorias_selecionadas, status_selecionado):
+    metricas = current_engine().metrics(filter_key(cidades_selecionadas, categorias_selecionadas, status_selecionado))
+    cores = ['#e74c3c', '#f39c12', '#27ae60']
     
-    metricas = html.Div([
+    return html.Div([
         html.Div([
-            html.H4(f'{total_sites:,}', style={'color': '#3498db', 'fontSize': 36, 'margin': 0}),
+            html.H4(f"{metricas['total_sites']:,}", style={'color': '#3498db', 'fontSize': 36, 'margin': 0}),
             html.P('Total de Sites', style={'margin': 0})
         ], className='three columns', style={'textAlign': 'center', 'backgroundColor': 'white', 'padding': 20, 'borderRadius': 5}),
         
-        html.Div([
-            html.H4(f'{total_vis_junho:,.0f}', style={'color': '#e74c3c', 'fontSize': 36, 'margin': 0}),
-            html.P('Visualizações Junho', style={'margin': 0})
-        ], className='three columns', style={'textAlign': 'center', 'backgroundColor': 'white', 'padding': 20, 'borderRadius': 5}),
-        
-        html.Div([
-            html.H4(f'{total_vis_julho:,.0f}', style={'color': '#f39c12', 'fontSize': 36, 'margin': 0}),
-            html.P('Visualizações Julho', style={'margin': 0})
-        ], className='three columns', style={'textAlign': 'center', 'backgroundColor': 'white', 'padding': 20, 'borderRadius': 5}),
-        
-        html.Div([
-            html.H4(f'{total_vis_agosto:,.0f}', style={'color': '#27ae60', 'fontSize': 36, 'margin': 0}),
-            html.P('Visualizações Agosto', style={'margin': 0})
+        *[html.Div([
+            html.H4(f'{total:,.0f}', style={'color': cor, 'fontSize': 36, 'margin': 0}),
+            html.P(f'Visualizações {mes}', style={'margin': 0})
         ], className='three columns', style={'textAlign': 'center', 'backgroundColor': 'white', 'padding': 20, 'borderRadius': 5})
+          for total, mes, cor in zip(metricas['visualizacoes'], MESES, cores)]
     ], className='row')
-    
-    # Gráfico de Visualizações por Mês
-    meses = ['Junho', 'Julho', 'Agosto']
-    visualizacoes = [total_vis_junho, total_vis_julho, total_vis_agosto]
-    fig_vis = px.bar(x=meses, y=visualizacoes, title='Total de Visualizações por Mês',
-                     color=visualizacoes, color_continuous_scale='viridis')
-    fig_vis.update_layout(showlegend=False, xaxis_title='Mês', yaxis_title='Visualizações')
-    
-    # Gráfico de Sites por Cidade
-    df_cidade = dff['cidade'].value_counts().head(10)
-    fig_cidade = px.pie(values=df_cidade.values, names=df_cidade.index, 
-                       title='Top 10 Cidades por Número de Sites')
-    
-    # Gráfico de Categoria vs Status
-    df_cat_status = dff.groupby(['categoria', 'status']).size().reset_index(name='count')
-    fig_cat_status = px.sunburst(df_cat_status, path=['categoria', 'status'], values='count',
-                                title='Distribuição por Categoria e Status')
-    
-    # Gráfico dos Top Sites por Visualizações
-    top_sites = dff.nlargest(10, 'total_visualizacoes')[['nome_fantasia', 'total_visualizacoes']]
-    fig_top = px.bar(top_sites, x='total_visualizacoes', y='nome_fantasia', 
-                     orientation='h', title='Top 10 Sites por Total de Visualizações')
-    fig_top.update_layout(yaxis={'categoryorder': 'total ascending'})
-    
-    # Tabela de dados
-    colunas_tabela = ['nome_fantasia', 'cidade', 'categoria', 'status', 'url', 
-                     'visualizacoes_junho', 'visualizacoes_julho', 'visualizacoes_agosto', 'total_visualizacoes']
-    
-    tabela = dash_table.DataTable(
-        data=dff[colunas_tabela].head(20).to_dict('records'),
-        columns=[{'name': col.replace('_', ' ').title(), 'id': col} for col in colunas_tabela],
+
+def register_figure_callback(graph_id):
+    @app.callback(Output(graph_id, 'figure'), FILTER_INPUTS)
+    def update_figure(cidades_selecionadas, categorias_selecionadas, status_selecionado):
+        return current_engine().figure(graph_id, filter_key(cidades_selecionadas, categorias_selecionadas, status_selecionado))
+    return update_figure
+
+for graph_id in FIGURES:
+    register_figure_callback(graph_id)
+
+@app.callback(Output('tabela-dados', 'children'), FILTER_INPUTS)
+def update_tabela(cidades_selecionadas, categorias_selecionadas, status_selecionado):
+    return dash_table.DataTable(
+        data=current_engine().table(filter_key(cidades_selecionadas, categorias_selecionadas, status_selecionado)),
+        columns=[{'name': col.replace('_', ' ').title(), 'id': col} for col in COLUNAS_TABELA],
         style_cell={'textAlign': 'left', 'padding': '10px'},
         style_header={'backgroundColor': '#3498db', 'color': 'white', 'fontWeight': 'bold'},
         style_data={'backgroundColor': '#ecf0f1'},
@@ -214,8 +334,6 @@ def update_dashboard(cidades_selecionadas, categorias_selecionadas, status_selec
         sort_action='native',
         filter_action='native'
     )
-    
-    return metricas, fig_vis, fig_cidade, fig_cat_status, fig_top, tabela
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8050)
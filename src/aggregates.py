@@ -0,0 +1,69 @@
+"""Agregados pré-calculados de cada snapshot.
+
+São construídos uma única vez quando um novo snapshot é carregado, de forma
+que ``/api/stats`` e os endpoints de agregados apenas leiam da memória. As
+contagens e somas são operações vetoriais sobre as colunas do snapshot.
+"""
+import numpy as np
+
+from columnar import to_python_number
+
+# Colunas de visualizações mensais somadas em ``views_por_mes``
+MONTH_COLUMNS = ['Views Set', 'Views Out', 'Views Nov']
+
+# Quantidade de veículos guardada no ranking por Média Trimestral
+TOP_SIZE = 50
+
+
+def category_counts(categorical):
+    """``{categoria: quantidade}`` de uma coluna codificada"""
+    counts = np.bincount(categorical.codes, minlength=len(categorical.categories))
+    return {category: int(count) for category, count in zip(categorical.categories, counts) if count}
+
+
+def build_aggregates(data):
+    """Calcula contagens, tabela cruzada, somas mensais e ranking do snapshot"""
+    status = data.categoricals['Status']
+    categoria = data.categoricals['Categoria']
+
+    cidade_counts = category_counts(data.categoricals['Cidade'])
+    cidade_counts.pop('N/A', None)
+
+    # Categoria x Status: um único bincount sobre o par de códigos
+    width = max(len(status.categories), 1)
+    pairs = categoria.codes.astype(np.int64) * width + status.codes
+    cross = np.bincount(pairs, minlength=len(categoria.categories) * width)
+    categoria_status = {}
+    for pair in np.flatnonzero(cross):
+        cat_code, status_code = divmod(int(pair), width)
+        by_status = categoria_status.setdefault(categoria.categories[cat_code], {})
+        by_status[status.categories[status_code]] = int(cross[pair])
+
+    views_por_mes = {}
+    for column in MONTH_COLUMNS:
+        numeric = data.numerics[column]
+        views_por_mes[column] = to_python_number(numeric.values[~numeric.missing].sum())
+
+    media = data.numerics['Média Trimestral']
+    eligible = np.flatnonzero(~media.missing & (media.values > 0))
+    # Maior média primeiro; empates mantêm a ordem da planilha
+    order = eligible[np.lexsort((eligible, -media.values[eligible]))][:TOP_SIZE]
+    top_trimestral = [
+        {
+            'Nome do veículo': data.names[i],
+            'Cidade': data.categoricals['Cidade'][i],
+            'Média Trimestral': to_python_number(media.values[i]),
+        }
+        for i in order.tolist()
+    ]
+
+    return {
+        'total_veiculos': len(data),
+        'total_cidades': len(cidade_counts),
+        'status_counts': category_counts(status),
+        'categoria_counts': category_counts(categoria),
+        'cidade_counts': cidade_counts,
+        'categoria_status': categoria_status,
+        'views_por_mes': views_por_mes,
+        'top_trimestral': top_trimestral,
+    }
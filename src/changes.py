@@ -0,0 +1,153 @@
+"""Diferenças entre snapshots e feed de alterações para os dashboards abertos.
+
+Cada linha é identificada pela chave estável do cadastro (data/hora da resposta
+do formulário). Duas cargas são comparadas por essa chave: linhas novas,
+removidas e alteradas (em qualquer coluna da API). As comparações são feitas
+coluna a coluna sobre as linhas em comum, sem montar registros (inclusive as
+colunas extras da planilha, que aparecem na exportação).
+
+O ``ChangeFeed`` guarda as últimas diferenças publicadas para que um cliente
+que já tem a versão N receba só o que mudou depois dela.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+# Quantidade de diferenças guardadas no feed
+FEED_SIZE = 50
+
+# Acima deste número de linhas alteradas, é mais barato o cliente recarregar tudo
+MAX_FEED_ROWS = 1000
+
+
+class ChangeSet:
+    """Linhas adicionadas e alteradas (posições no snapshot novo) e chaves removidas"""
+
+    __slots__ = ('added', 'changed', 'removed', 'stable')
+
+    def __init__(self, added, changed, removed, stable):
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        # As linhas antigas mantêm suas posições e as novas ficam no fim,
+        # então estruturas do snapshot anterior podem ser atualizadas
+        self.stable = stable
+
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    def summary(self):
+        return {'added': len(self.added), 'changed': len(self.changed), 'removed': len(self.removed)}
+
+    def to_payload(self, data):
+        """Diferença no formato da API, com os registros completos das linhas novas e alteradas"""
+        def rows(positions):
+            return [{'key': data.keys[i], 'record': record}
+                    for i, record in zip(positions.tolist(), data.to_records(positions))]
+
+        return {
+            'added': rows(self.added),
+            'changed': rows(self.changed),
+            'removed': list(self.removed),
+        }
+
+
+def _recode(old, new):
+    """Códigos de ``new`` para cada categoria de ``old`` (-1 se não existir)"""
+    lookup = {category: code for code, category in enumerate(new.categories)}
+    return np.asarray([lookup.get(category, -1) for category in old.categories], dtype=np.int64)
+
+
+def diff_data(old, new):
+    """Compara dois ``ColumnarData`` pela chave das linhas"""
+    old_positions = {key: i for i, key in enumerate(old.keys)}
+    common_old = []
+    common_new = []
+    added = []
+    for j, key in enumerate(new.keys):
+        i = old_positions.pop(key, None)
+        if i is None:
+            added.append(j)
+        else:
+            common_old.append(i)
+            common_new.append(j)
+    removed = list(old_positions)
+
+    common_old = np.asarray(common_old, dtype=np.int64)
+    common_new = np.asarray(common_new, dtype=np.int64)
+    differs = (np.asarray(old.names, dtype=object)[common_old]
+               != np.asarray(new.names, dtype=object)[common_new]).astype(bool)
+    for column, categorical in new.categoricals.items():
+        previous = old.categoricals[column]
+        if not len(previous.categories):
+            continue
+        differs |= _recode(previous, categorical)[previous.codes[common_old]] != categorical.codes[common_new]
+    for column, numeric in new.numerics.items():
+        previous = old.numerics[column]
+        old_missing = previous.missing[common_old]
+        new_missing = numeric.missing[common_new]
+        differs |= (old_missing != new_missing) | (~new_missing & (previous.values[common_old] != numeric.values[common_new]))
+
+    for column in old.extras.keys() | new.extras.keys():
+        previous = old.extras.get(column)
+        current = new.extras.get(column)
+        if previous is None or current is None:
+            # Coluna incluída ou removida na planilha: todas as linhas mudaram
+            differs[:] = True
+            break
+        differs |= _recode(previous, current)[previous.codes[common_old]] != current.codes[common_new]
+
+    added = np.asarray(added, dtype=np.int64)
+    stable = (not removed and np.array_equal(common_old, common_new)
+              and np.array_equal(common_new, np.arange(len(common_new))))
+    return ChangeSet(added, common_new[differs], removed, stable)
+
+
+class ChangeFeed:
+    """Últimas diferenças publicadas, com espera por novas versões"""
+
+    def __init__(self, size=FEED_SIZE):
+        self._entries = deque(maxlen=size)
+        self._condition = threading.Condition()
+        self.version = None
+
+    def publish(self, snapshot, previous):
+        """Registra a diferença entre ``previous`` e ``snapshot``.
+
+        Sem snapshot anterior ou com diferenças grandes demais, o histórico é
+        descartado e clientes em versões antigas precisam recarregar.
+        """
+        changes = getattr(snapshot, 'changes', None)
+        with self._condition:
+            if previous is not None and changes is not None and len(changes) <= MAX_FEED_ROWS:
+                entry = {'from_version': previous.version, 'version': snapshot.version}
+                entry.update(changes.summary())
+                entry['changes'] = changes.to_payload(snapshot.data)
+                self._entries.append(entry)
+            else:
+                self._entries.clear()
+            self.version = snapshot.version
+            self._condition.notify_all()
+
+    def since(self, version):
+        """Diferenças publicadas depois de ``version``.
+
+        Retorna ``[]`` se o cliente já está na versão atual e ``None`` se a
+        versão não pode ser alcançada pelo histórico (o cliente deve recarregar).
+        """
+        with self._condition:
+            # Versão igual ou mais nova (ex.: outro worker já adotou o próximo snapshot)
+            if self.version is None or version >= self.version:
+                return []
+            entries = list(self._entries)
+        for i, entry in enumerate(entries):
+            if entry['from_version'] == version:
+                return entries[i:]
+        return None
+
+    def wait(self, version, timeout):
+        """Espera até haver uma versão mais nova que ``version`` (ou o tempo acabar)"""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.version is not None and (version is None or self.version > version), timeout)
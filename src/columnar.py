@@ -0,0 +1,178 @@
+"""Representação em colunas do snapshot em memória.
+
+Em vez de uma lista de dicionários que repetem as mesmas chaves em cada linha,
+os dados ficam em colunas:
+
+- textos de baixa cardinalidade (Cidade, Status, Categoria...) como códigos
+  ``uint32`` que apontam para uma lista de categorias internadas;
+- números como ``float64`` com uma máscara de valores ausentes;
+- o nome do veículo como lista de ``str``;
+- a chave estável de cada linha (data/hora da resposta) como lista de ``str``;
+- as demais colunas da planilha (``extras``), com o texto original, também
+  codificadas.
+
+Os registros em formato de dicionário (para JSON) são montados apenas quando
+pedidos, e ``Record`` dá acesso a uma linha sem copiá-la.
+"""
+import sys
+
+import numpy as np
+
+from normalize import NUMERIC_COLUMNS, RECORD_COLUMNS, TEXT_COLUMNS, row_keys
+
+NAME_COLUMN = 'Nome do veículo'
+CATEGORICAL_COLUMNS = [column for column in TEXT_COLUMNS if column != NAME_COLUMN]
+
+
+class Categorical:
+    """Coluna de texto codificada: ``codes[i]`` indexa ``categories``"""
+
+    __slots__ = ('codes', 'categories')
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def encode(cls, values):
+        lookup = {}
+        categories = []
+        codes = np.empty(len(values), dtype=np.uint32)
+        for i, value in enumerate(values):
+            value = 'N/A' if value is None else value
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(categories)
+                categories.append(sys.intern(value))
+            codes[i] = code
+        return cls(codes, categories)
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+
+class Numeric:
+    """Coluna numérica com máscara de ausentes (``missing[i]`` verdadeiro = 'N/A')"""
+
+    __slots__ = ('values', 'missing')
+
+    def __init__(self, values, missing):
+        self.values = values
+        self.missing = missing
+
+    @classmethod
+    def encode(cls, values):
+        missing = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+        array = np.fromiter((0.0 if value is None else value for value in values), dtype=np.float64,
+                            count=len(values))
+        return cls(array, missing)
+
+    def __getitem__(self, i):
+        if self.missing[i]:
+            return 'N/A'
+        return to_python_number(self.values[i])
+
+
+def to_python_number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class Record:
+    """Acesso somente leitura a uma linha, com a mesma interface de um dicionário"""
+
+    __slots__ = ('_data', '_i')
+
+    def __init__(self, data, i):
+        self._data = data
+        self._i = i
+
+    def __getitem__(self, column):
+        return self._data.value(column, self._i)
+
+    def get(self, column, default=None):
+        if column not in self._data.columns:
+            return default
+        return self._data.value(column, self._i)
+
+    def keys(self):
+        return list(RECORD_COLUMNS)
+
+    def to_dict(self):
+        return {column: self[column] for column in RECORD_COLUMNS}
+
+
+class ColumnarData:
+    """Snapshot em colunas; comporta-se como uma sequência de ``Record``"""
+
+    def __init__(self, names, categoricals, numerics, keys=None, extras=None):
+        self.names = names
+        self.categoricals = categoricals
+        self.numerics = numerics
+        self.keys = keys if keys is not None else row_keys([None] * len(names), names)
+        self.extras = extras if extras is not None else {}
+        self.columns = {NAME_COLUMN: names}
+        self.columns.update(categoricals)
+        self.columns.update(numerics)
+        self.columns.update(self.extras)
+
+    @classmethod
+    def from_table(cls, table):
+        """Constrói a partir de uma ``NormalizedTable``"""
+        columns = table.columns
+        categoricals = {column: Categorical.encode(columns[column]) for column in CATEGORICAL_COLUMNS}
+        numerics = {}
+        encoded = {}
+        for column in NUMERIC_COLUMNS:
+            # Views Nov e Views Ago compartilham a mesma lista de origem
+            source = id(columns[column])
+            if source not in encoded:
+                encoded[source] = Numeric.encode(columns[column])
+            numerics[column] = encoded[source]
+        extras = {column: Categorical.encode(values) for column, values in table.extras.items()}
+        return cls(list(columns[NAME_COLUMN]), categoricals, numerics, table.keys, extras)
+
+    @classmethod
+    def empty(cls):
+        return cls([], {column: Categorical(np.empty(0, dtype=np.uint32), []) for column in CATEGORICAL_COLUMNS},
+                   {column: Numeric(np.empty(0), np.empty(0, dtype=bool)) for column in NUMERIC_COLUMNS}, [])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Record(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Record(self, i)
+
+    def value(self, column, i):
+        if column == NAME_COLUMN:
+            return self.names[i]
+        return self.columns[column][i]
+
+    def to_records(self, positions=None):
+        """Registros como dicionários (formato da API), só para as posições pedidas"""
+        if positions is None:
+            positions = range(len(self))
+        positions = [int(i) for i in positions]
+        columns = []
+        for column in RECORD_COLUMNS:
+            if column == NAME_COLUMN:
+                columns.append((column, [self.names[i] for i in positions]))
+            elif column in self.categoricals:
+                categorical = self.categoricals[column]
+                categories = categorical.categories
+                columns.append((column, [categories[code] for code in categorical.codes[positions].tolist()]))
+            else:
+                numeric = self.numerics[column]
+                values = numeric.values[positions].tolist()
+                missing = numeric.missing[positions].tolist()
+                columns.append((column, ['N/A' if absent else (int(value) if value.is_integer() else value)
+                                         for value, absent in zip(values, missing)]))
+        return [dict(zip(RECORD_COLUMNS, row)) for row in zip(*(values for _, values in columns))]
@@ -0,0 +1,133 @@
+"""Cobertura de veículos por município (análise de desertos de mídia).
+
+A tabela de referência ``municipios.csv`` lista os municípios de cada UF, com
+grafias alternativas. As cidades do cadastro são comparadas pelo nome
+normalizado (sem acentos, maiúsculas, pontuação ou sufixo da UF, ex.:
+"maceio - AL" -> "maceio"), uma vez por categoria da coluna Cidade e não por
+linha.
+
+As contagens de cada snapshot ficam em um array município x Status x
+Categoria: filtrar por status e categoria é só somar fatias dele.
+"""
+import csv
+import os
+
+import numpy as np
+
+from data_index import normalize_value
+from search_index import tokenize
+
+REFERENCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'municipios.csv')
+DEFAULT_UF = 'AL'
+
+# Colunas que podem filtrar a análise (parâmetro da API -> coluna)
+COVERAGE_FILTERS = {'status': 'Status', 'categoria': 'Categoria'}
+
+
+def municipality_key(name, uf=None):
+    """Nome comparável de um município (``"Olho d'Água" -> "olho d agua"``)"""
+    words = tokenize(name)
+    if uf and len(words) > 1 and words[-1] == uf.casefold():
+        words = words[:-1]
+    return ' '.join(words)
+
+
+def load_reference(path=REFERENCE_PATH):
+    """``{uf: [municípios]}`` e ``{uf: {nome normalizado: posição}}``"""
+    municipalities = {}
+    keys = {}
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        for row in csv.DictReader(file):
+            uf = row['uf'].strip().upper()
+            names = municipalities.setdefault(uf, [])
+            lookup = keys.setdefault(uf, {})
+            for name in [row['municipio']] + row['aliases'].split('|'):
+                if name.strip():
+                    lookup.setdefault(municipality_key(name, uf), len(names))
+            names.append(row['municipio'].strip())
+    return municipalities, keys
+
+
+MUNICIPALITIES, MUNICIPALITY_KEYS = load_reference()
+
+
+class Coverage:
+    """Veículos por município de cada UF de referência, por Status e Categoria"""
+
+    def __init__(self, data, index, reference=None):
+        municipalities, keys = reference or (MUNICIPALITIES, MUNICIPALITY_KEYS)
+        self.index = index
+        self.municipalities = municipalities
+        cidade = data.categoricals['Cidade']
+        status = data.categoricals['Status']
+        categoria = data.categoricals['Categoria']
+
+        # Cidade (código) x Status x Categoria com um único bincount
+        shape = (len(cidade.categories), max(len(status.categories), 1), max(len(categoria.categories), 1))
+        cells = (cidade.codes.astype(np.int64) * shape[1] + status.codes) * shape[2] + categoria.codes
+        per_city = np.bincount(cells, minlength=shape[0] * shape[1] * shape[2]).reshape(shape)
+        city_totals = per_city.sum(axis=(1, 2))
+        city_keys = [municipality_key(category) for category in cidade.categories]
+
+        # UF -> contagens por município e valores da coluna Cidade reconhecidos
+        self.counts = {}
+        self.cities = {}
+        self.unmatched = {}
+        for uf, names in municipalities.items():
+            lookup = keys[uf]
+            positions = np.asarray([lookup.get(key, lookup.get(municipality_key(category, uf), -1))
+                                    for key, category in zip(city_keys, cidade.categories)], dtype=np.int64)
+            matched = np.flatnonzero((positions >= 0) & (city_totals > 0))
+            counts = np.zeros((len(names),) + shape[1:], dtype=np.int64)
+            np.add.at(counts, positions[matched], per_city[matched])
+            self.counts[uf] = counts
+            self.cities[uf] = sorted({normalize_value(cidade.categories[c]) for c in matched.tolist()},
+                                     key=str.casefold)
+            unmatched = {}
+            for code in np.flatnonzero((positions < 0) & (city_totals > 0)).tolist():
+                value = normalize_value(cidade.categories[code])
+                if value != 'N/A':
+                    unmatched[value] = unmatched.get(value, 0) + int(city_totals[code])
+            self.unmatched[uf] = unmatched
+
+    def _selection(self, column, values):
+        """Máscara dos códigos de ``column`` com os valores pedidos (todos se vazio)"""
+        categories = self.index.data.categoricals[column].categories
+        size = max(len(categories), 1)
+        if not values:
+            return np.ones(size, dtype=bool)
+        mask = np.zeros(size, dtype=bool)
+        for value in values:
+            codes = self.index.value_codes[column].get(normalize_value(value))
+            if codes is not None:
+                mask[codes] = True
+        return mask
+
+    def report(self, uf=DEFAULT_UF, filters=None):
+        """Desertos (0 veículos), cobertura crítica (1) e adequada (2+) da UF.
+
+        ``filters`` é ``{coluna: [valores]}`` com Status e/ou Categoria.
+        """
+        uf = uf.upper()
+        if uf not in self.counts:
+            raise ValueError(f"UF sem tabela de municípios: {uf}. Use uma de: {', '.join(sorted(self.counts))}")
+        filters = filters or {}
+        status = self._selection('Status', filters.get('Status'))
+        categoria = self._selection('Categoria', filters.get('Categoria'))
+        totals = self.counts[uf][:, status][:, :, categoria].sum(axis=(1, 2))
+
+        names = self.municipalities[uf]
+        desertos = [names[i] for i in np.flatnonzero(totals == 0).tolist()]
+        criticos = [{'municipio': names[i], 'veiculos': 1} for i in np.flatnonzero(totals == 1).tolist()]
+        adequados = [{'municipio': names[i], 'veiculos': int(totals[i])}
+                     for i in np.flatnonzero(totals >= 2).tolist()]
+        return {
+            'uf': uf,
+            'total_municipios': len(names),
+            'desertos': desertos,
+            'criticos': criticos,
+            'adequados': adequados,
+            'percentual_desertos': round(100 * len(desertos) / len(names), 1) if names else 0.0,
+            'cidades': self.cities[uf],
+            'fora_da_referencia': self.unmatched[uf],
+        }
@@ -0,0 +1,126 @@
+"""Índices por campo para filtrar, ordenar e paginar no servidor.
+
+Construídos uma vez por snapshot: cada valor de Cidade, Status e Categoria
+aponta para os códigos da coluna codificada que o representam, e cada coluna
+ordenável tem a ordem dos registros pré-calculada. Filtros viram máscaras
+booleanas combinadas de forma vetorial.
+"""
+import numpy as np
+
+from columnar import NAME_COLUMN
+
+# Parâmetro da API -> coluna dos registros
+FILTER_FIELDS = {
+    'cidade': 'Cidade',
+    'status': 'Status',
+    'categoria': 'Categoria',
+}
+
+NUMERIC_SORT_FIELDS = ['Média Trimestral', 'Views Set', 'Views Out', 'Views Nov']
+TEXT_SORT_FIELDS = ['Nome do veículo', 'Cidade', 'Status', 'Categoria']
+SORT_FIELDS = TEXT_SORT_FIELDS + NUMERIC_SORT_FIELDS
+
+
+def normalize_value(value):
+    """Valor usado nos índices (sem espaços nas pontas, ex.: 'APROVADO ')"""
+    if value is None:
+        return 'N/A'
+    return str(value).strip() or 'N/A'
+
+
+class DataIndex:
+    """Códigos por valor e ordens pré-calculadas de um snapshot em colunas"""
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+
+        # coluna -> {valor normalizado: códigos das categorias com esse valor}
+        self.value_codes = {}
+        for column in FILTER_FIELDS.values():
+            groups = {}
+            for code, category in enumerate(data.categoricals[column].categories):
+                groups.setdefault(normalize_value(category), []).append(code)
+            self.value_codes[column] = {value: np.asarray(codes, dtype=np.uint32) for value, codes in groups.items()}
+
+        # Para cada coluna: posições com valor em ordem crescente + posições sem valor
+        self.orders = {}
+        names = [normalize_value(name) for name in data.names]
+        present = np.fromiter((name != 'N/A' for name in names), dtype=bool, count=self.size)
+        keys = np.asarray([name.casefold() for name in names], dtype=object)
+        self.orders[NAME_COLUMN] = self._split_order(present, keys)
+        for column in TEXT_SORT_FIELDS[1:]:
+            categorical = data.categoricals[column]
+            normalized = [normalize_value(category) for category in categorical.categories]
+            # Ordem alfabética das categorias aplicada aos códigos de cada linha
+            category_rank = np.empty(len(normalized), dtype=np.int64)
+            category_rank[sorted(range(len(normalized)), key=lambda c: normalized[c].casefold())] = np.arange(len(normalized))
+            category_present = np.asarray([value != 'N/A' for value in normalized], dtype=bool)
+            self.orders[column] = self._split_order(category_present[categorical.codes],
+                                                    category_rank[categorical.codes])
+        for column in NUMERIC_SORT_FIELDS:
+            numeric = data.numerics[column]
+            self.orders[column] = self._split_order(~numeric.missing, numeric.values)
+
+        self._all_facets = self._count_facets(None)
+
+    @staticmethod
+    def _split_order(present, keys):
+        present_positions = np.flatnonzero(present)
+        ordered = present_positions[np.argsort(keys[present_positions], kind='stable')]
+        return ordered, np.flatnonzero(~present)
+
+    def values(self, column):
+        """Valores distintos (exceto N/A) de uma coluna filtrável, em ordem alfabética"""
+        return sorted((value for value in self.value_codes[column] if value != 'N/A'), key=str.casefold)
+
+    def match(self, filters):
+        """Máscara dos registros que atendem a todos os filtros (``{coluna: [valores]}``).
+
+        Valores de uma mesma coluna são combinados com OU; colunas diferentes, com E.
+        Retorna ``None`` quando não há filtros (todos os registros).
+        """
+        selected = None
+        for column, values in filters.items():
+            codes = [self.value_codes[column].get(normalize_value(value)) for value in values]
+            codes = [c for c in codes if c is not None]
+            if codes:
+                mask = np.isin(self.data.categoricals[column].codes, np.concatenate(codes))
+            else:
+                mask = np.zeros(self.size, dtype=bool)
+            selected = mask if selected is None else selected & mask
+        return selected
+
+    def ordered(self, selection, sort=None, descending=False):
+        """Posições selecionadas na ordem pedida; registros sem valor ficam no fim"""
+        if sort is None:
+            return np.arange(self.size) if selection is None else np.flatnonzero(selection)
+
+        present, missing = self.orders[sort]
+        if descending:
+            present = present[::-1]
+        order = np.concatenate((present, missing))
+        return order if selection is None else order[selection[order]]
+
+    def facets(self, selection):
+        """Contagens por Status, Categoria e Cidade do conjunto selecionado"""
+        if selection is None:
+            return self._all_facets
+        return self._count_facets(selection)
+
+    def _count_facets(self, selection):
+        facets = {}
+        for key, column in (('status_counts', 'Status'), ('categoria_counts', 'Categoria'),
+                            ('cidade_counts', 'Cidade')):
+            categorical = self.data.categoricals[column]
+            codes = categorical.codes if selection is None else categorical.codes[selection]
+            counts = np.bincount(codes, minlength=len(categorical.categories))
+            merged = {}
+            for category, count in zip(categorical.categories, counts.tolist()):
+                if count:
+                    value = normalize_value(category)
+                    merged[value] = merged.get(value, 0) + count
+            if column == 'Cidade':
+                merged.pop('N/A', None)
+            facets[key] = merged
+        return facets
@@ -0,0 +1,170 @@
+"""Exportação em massa (CSV, JSON Lines e Parquet) gerada aos poucos.
+
+As linhas selecionadas são convertidas em blocos de ``CHUNK_ROWS`` e cada
+bloco é enviado (e comprimido) antes do próximo ser montado: a memória usada
+não depende do tamanho do cadastro. Além das colunas normalizadas da API, a
+exportação inclui todas as outras colunas da planilha (``ColumnarData.extras``)
+com o texto original.
+
+Valores ausentes saem vazios no CSV e como ``null`` no JSON Lines e no Parquet.
+"""
+import csv
+import io
+import json
+import zlib
+
+import numpy as np
+
+from columnar import NAME_COLUMN, to_python_number
+from normalize import RECORD_COLUMNS, SNAPSHOT_ONLY_COLUMNS
+from responses import BROTLI_QUALITY, GZIP_LEVEL, brotli
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow é opcional; sem ele, apenas CSV e JSON Lines
+    pyarrow = None
+
+# Formato -> (tipo do conteúdo, extensão do arquivo)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+if pyarrow is not None:
+    EXPORT_FORMATS['parquet'] = ('application/vnd.apache.parquet', 'parquet')
+
+# Linhas convertidas por vez (e por row group no Parquet)
+CHUNK_ROWS = 5000
+
+# Codificações aceitas na compressão em fluxo (o Parquet já é comprimido)
+STREAM_ENCODINGS = {'gzip', 'br'} if brotli is not None else {'gzip'}
+
+
+def export_columns(data):
+    """Todas as colunas exportáveis do snapshot, na ordem padrão"""
+    return RECORD_COLUMNS + SNAPSHOT_ONLY_COLUMNS + list(data.extras)
+
+
+def parse_columns(data, values):
+    """Colunas pedidas (``columns=a,b`` ou repetido); todas se nenhuma for pedida"""
+    available = export_columns(data)
+    requested = [column.strip() for value in values for column in value.split(',') if column.strip()]
+    if not requested:
+        return available
+    unknown = [column for column in requested if column not in available]
+    if unknown:
+        raise ValueError(f"Colunas inválidas: {', '.join(unknown)}. Veja /api/export/columns")
+    return list(dict.fromkeys(requested))
+
+
+def _column_reader(data, column):
+    """Função que devolve os valores de ``column`` para um bloco de posições"""
+    if column == NAME_COLUMN:
+        names = data.names
+        return lambda positions: [names[i] for i in positions.tolist()]
+    if column in data.numerics:
+        numeric = data.numerics[column]
+        return lambda positions: [None if absent else to_python_number(value) for value, absent in
+                                  zip(numeric.values[positions].tolist(), numeric.missing[positions].tolist())]
+    if column in data.categoricals:
+        categorical = data.categoricals[column]
+        categories = [None if category == 'N/A' else category for category in categorical.categories]
+    else:
+        categorical = data.extras[column]
+        categories = categorical.categories
+    return lambda positions: [categories[code] for code in categorical.codes[positions].tolist()]
+
+
+def _chunks(data, positions, columns):
+    """Blocos de linhas como listas de colunas"""
+    positions = np.asarray(positions, dtype=np.int64)
+    readers = [_column_reader(data, column) for column in columns]
+    for start in range(0, len(positions), CHUNK_ROWS):
+        chunk = positions[start:start + CHUNK_ROWS]
+        yield [reader(chunk) for reader in readers]
+
+
+def generate_csv(data, positions, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for values in _chunks(data, positions, columns):
+        writer.writerows(zip(*values))
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def generate_jsonl(data, positions, columns):
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    for values in _chunks(data, positions, columns):
+        yield ''.join(encode(dict(zip(columns, row))) + '\n' for row in zip(*values)).encode('utf-8')
+
+
+class _ChunkSink:
+    """Arquivo só de escrita que acumula os bytes até serem lidos com ``drain``"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def generate_parquet(data, positions, columns):
+    """Parquet com um row group por bloco, enviado assim que é escrito"""
+    schema = pyarrow.schema([(column, pyarrow.float64() if column in data.numerics else pyarrow.string())
+                             for column in columns])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    for values in _chunks(data, positions, columns):
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(values, schema)], schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+GENERATORS = {'csv': generate_csv, 'jsonl': generate_jsonl, 'parquet': generate_parquet}
+
+
+def generate_export(export_format, data, positions, columns):
+    """Bytes do arquivo exportado, bloco a bloco"""
+    return GENERATORS[export_format](data, positions, columns)
+
+
+def compress_stream(chunks, encoding):
+    """Comprime o fluxo com ``gzip`` ou ``br`` sem juntar os blocos"""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        finish = compressor.flush
+        process = compressor.compress
+    else:
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        finish = compressor.finish
+        process = compressor.process
+    for chunk in chunks:
+        compressed = process(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
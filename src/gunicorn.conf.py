@@ -0,0 +1,49 @@
+"""Configuração do gunicorn para produção (``gunicorn -c gunicorn.conf.py main:app``).
+
+O app é importado no processo mestre (``preload_app``) e o snapshot é carregado
+ali uma única vez, do arquivo salvo ou, se não houver, do Google Sheets. Os
+workers herdam a memória por copy-on-write e os arrays do snapshot salvo são
+mapeados do mesmo arquivo, então nenhum worker busca a planilha ao iniciar.
+Depois, cada worker atualiza o snapshot em segundo plano, coordenado pelo lock
+do arquivo de snapshot para que apenas um deles consulte o Google por vez.
+"""
+import gc
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+# Cada conexão SSE de /api/changes/stream ocupa uma destas threads por até 5
+# minutos: ao ligar MAX_CHANGE_STREAMS, aumente GUNICORN_THREADS na mesma medida
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = 60
+preload_app = True
+accesslog = '-'
+
+# Cada worker grava as suas métricas aqui e /metrics soma todos (ver metrics.py)
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f"app-metrics-{bind.rsplit(':', 1)[1]}"))
+
+
+def on_starting(server):
+    from metrics import clear_directory
+
+    # Contadores de uma execução anterior não podem entrar nos totais desta
+    clear_directory(os.environ['METRICS_DIR'])
+
+
+def when_ready(server):
+    from main import snapshot_cache
+
+    snapshot = snapshot_cache.preload()
+    if snapshot is not None:
+        server.log.info("Snapshot %s pronto (%s, %d registros)", snapshot.version, snapshot.source, len(snapshot.data))
+    # Objetos já carregados não são visitados pelo GC nos workers, o que
+    # evita copiar páginas compartilhadas só para atualizar o cabeçalho do GC
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from main import sheets_fetcher
+
+    sheets_fetcher.reset_session()
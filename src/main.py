@@ -1,51 +1,80 @@
-from flask import Flask, jsonify, render_template, request
-import requests
+from flask import Flask, Response, g, jsonify, render_template, request
+import hashlib
 import json
-import csv
-import io
 import os
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+
+from aggregates import TOP_SIZE, build_aggregates
+from changes import ChangeFeed
+from columnar import ColumnarData
+from coverage import COVERAGE_FILTERS, DEFAULT_UF, Coverage
+from data_index import FILTER_FIELDS, SORT_FIELDS, DataIndex
+from metrics import (CACHE_REQUESTS, HTTP_REQUESTS, LOADER_STAGE, Counter, Gauge, enable_multiprocess,
+                     render as render_metrics)
+from export import (CHUNK_ROWS, EXPORT_FORMATS, STREAM_ENCODINGS, compress_stream, export_columns,
+                    generate_export, parse_columns)
+from normalize import normalize_csv
+from profiler import SlowRequestProfiler
+from reports import REPORT_FORMATS, ReportCache, html_context, render_pdf, report_data
+from responses import (CACHE_CONTROL, LazyPreparedResponse, PreparedResponse, add_conditional_headers,
+                       negotiate_encoding, stream_json_list)
+from search_index import SearchIndex
+from sheets_fetcher import SheetsFetcher
+from snapshot_cache import SnapshotCache
 
 app = Flask(__name__)
 
+# Profiler por amostragem das requisições mais lentas que PROFILE_SLOW_REQUESTS segundos (opcional)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(__file__), '.cache', 'profiles'))
+profiler = (SlowRequestProfiler(float(os.environ['PROFILE_SLOW_REQUESTS']), PROFILE_DIR)
+            if os.environ.get('PROFILE_SLOW_REQUESTS') else None)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    if profiler is not None:
+        g.profile = profiler.begin()
+
+@app.after_request
+def record_request(response):
+    """Latência por rota (o corpo de respostas em fluxo, como SSE e exportação, não entra)"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        duration = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUESTS.observe(duration, route=route, method=request.method, status=response.status_code)
+        if profiler is not None and 'profile' in g:
+            profiler.end(g.pop('profile'), f'{request.method} {request.full_path.rstrip("?")}', duration)
+    return response
+
 # Configurar CORS manualmente
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    return response
+    return add_conditional_headers(request, response)
 
-# URLs do Google Sheets (múltiplas tentativas)
+# URLs do Google Sheets (múltiplas tentativas); GOOGLE_SHEETS_URLS (separadas por
+# vírgula) substitui a lista, ex.: para testar com um servidor local
 GOOGLE_SHEETS_URLS = [
     "https://docs.google.com/spreadsheets/d/17TnGB6NpsziDec4fPH-d0TCQwk2LN0BAv6yjmIpyZnI/export?format=csv&gid=1225239898",
     "https://docs.google.com/spreadsheets/d/17TnGB6NpsziDec4fPH-d0TCQwk2LN0BAv6yjmIpyZnI/export?format=csv",
     "https://docs.google.com/spreadsheets/d/17TnGB6NpsziDec4fPH-d0TCQwk2LN0BAv6yjmIpyZnI/gviz/tq?tqx=out:csv&gid=1225239898"
 ]
+if os.environ.get('GOOGLE_SHEETS_URLS'):
+    GOOGLE_SHEETS_URLS = [url.strip() for url in os.environ['GOOGLE_SHEETS_URLS'].split(',') if url.strip()]
 
-def clean_numeric_value(value):
-    """Limpa e converte valores numéricos"""
-    if not value or str(value).lower() in ['não tem analytics', 'n/a', 'nan', '']:
-        return 'N/A'
-    
-    # Converter para string e limpar
-    str_value = str(value).strip()
-    
-    # Remover caracteres não numéricos exceto pontos e vírgulas
-    import re
-    cleaned = re.sub(r'[^\d.,]', '', str_value)
-    
-    # Substituir vírgulas por pontos
-    cleaned = cleaned.replace(',', '.')
-    
-    try:
-        # Tentar converter para float e depois para int se for número inteiro
-        num_value = float(cleaned)
-        if num_value.is_integer():
-            return int(num_value)
-        return num_value
-    except:
-        return 'N/A'
+# Segundos até disparar a próxima URL em paralelo e prazo total dos downloads
+SHEETS_HEDGE_DELAY = float(os.environ.get('SHEETS_HEDGE_DELAY', '2'))
+SHEETS_DEADLINE = float(os.environ.get('SHEETS_DEADLINE', '20'))
+
+# Sessão HTTP compartilhada com requisições condicionais e ranking das URLs
+sheets_fetcher = SheetsFetcher(GOOGLE_SHEETS_URLS, timeout=15)
 
 def load_data_from_local_csv():
     """Carrega dados do arquivo CSV local"""
@@ -54,127 +83,239 @@ def load_data_from_local_csv():
         
         if not os.path.exists(csv_path):
             print(f"Arquivo CSV não encontrado: {csv_path}")
-            return []
+            return ColumnarData.empty()
         
-        data = []
-        with open(csv_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            for row in reader:
-                # Mapear colunas para nomes mais limpos
-                clean_row = {}
-                
-                # Nome do veículo
-                nome_col = 'Nome do veículo.\n'
-                if nome_col in row:
-                    clean_row['Nome do veículo'] = row[nome_col] or 'N/A'
-                else:
-                    clean_row['Nome do veículo'] = 'N/A'
-                
-                # Outras colunas
-                clean_row['Cidade'] = row.get('Cidade', 'N/A')
-                clean_row['Status'] = row.get('Status', 'N/A')
-                clean_row['Categoria'] = row.get('Categoria', 'N/A')
-                clean_row['Cookies'] = row.get('Cookies', 'N/A')
-                clean_row['Expediente'] = row.get('Expediente', 'N/A')
-                clean_row['Endereço'] = row.get('Endereço no site', 'N/A')
-                clean_row['Analytics'] = row.get('Google analytics ', 'N/A')
-                
-                # Views com limpeza numérica
-                clean_row['Views Set'] = clean_numeric_value(row.get('Views Setembro', '0'))
-                clean_row['Views Out'] = clean_numeric_value(row.get('Views Outubro', '0'))
-                clean_row['Views Nov'] = clean_numeric_value(row.get('Views Novembro', '0'))
-                clean_row['Média Trimestral'] = clean_numeric_value(row.get('Média Trimestral', '0'))
-                clean_row['Views Ago'] = clean_numeric_value(row.get('Views Novembro', '0'))  # Usando Nov como Ago
-                
-                # Só adicionar se tiver nome válido
-                if clean_row['Nome do veículo'] != 'N/A' and clean_row['Nome do veículo'].strip():
-                    data.append(clean_row)
+        with open(csv_path, 'r', encoding='utf-8', newline='') as file:
+            with LOADER_STAGE.time(stage='normalize'):
+                table = normalize_csv(file)
+        with LOADER_STAGE.time(stage='encode'):
+            data = ColumnarData.from_table(table)
         
         print(f"Dados carregados do CSV local: {len(data)} registros")
         return data
         
     except Exception as e:
         print(f"Erro ao carregar CSV local: {e}")
-        return []
+        return ColumnarData.empty()
+
+def validate_sheets_csv(result):
+    """Descarta respostas que não são CSV sem processá-las (``ValueError``)"""
+    text = result.text[:1024].lstrip() if result.text else ''
+    if not text:
+        raise ValueError('Resposta vazia')
+    # Verificar se é HTML (erro de acesso) ou CSV
+    if text.startswith('<'):
+        raise ValueError('Resposta HTML')
+
+def parse_sheets_csv(result):
+    """Converte a resposta vencedora do Google Sheets (``ValueError`` se não tiver registros)"""
+    # Leitura do CSV e normalização são uma única passada
+    with LOADER_STAGE.time(stage='normalize'):
+        table = normalize_csv(result.text)
+    with LOADER_STAGE.time(stage='encode'):
+        data = ColumnarData.from_table(table)
+    if len(data) == 0:
+        raise ValueError('CSV vazio')
+    return data
 
 def load_data_from_sheets():
-    """Carrega dados diretamente do Google Sheets com múltiplas tentativas"""
-    
-    # Primeiro tentar carregar do Google Sheets
-    for url in GOOGLE_SHEETS_URLS:
-        try:
-            print(f"Tentando carregar dados do Google Sheets: {url}")
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            response = requests.get(url, timeout=15, headers=headers, allow_redirects=True)
-            
-            if response.status_code == 200 and response.text.strip():
-                # Verificar se é HTML (erro) ou CSV
-                if response.text.strip().startswith('<'):
-                    print(f"Resposta HTML recebida (erro de acesso): {url}")
-                    continue
-                
-                # Tentar processar como CSV
-                csv_data = response.text
-                reader = csv.DictReader(io.StringIO(csv_data))
-                
-                data = []
-                for row in reader:
-                    # Mapear colunas para nomes mais limpos
-                    clean_row = {}
-                    
-                    # Nome do veículo (tentar diferentes variações)
-                    nome_options = ['Nome do veículo.\n', 'Nome do veículo', 'Nome']
-                    nome_value = 'N/A'
-                    for nome_col in nome_options:
-                        if nome_col in row and row[nome_col]:
-                            nome_value = row[nome_col]
-                            break
-                    clean_row['Nome do veículo'] = nome_value
-                    
-                    # Outras colunas
-                    clean_row['Cidade'] = row.get('Cidade', 'N/A')
-                    clean_row['Status'] = row.get('Status', 'N/A')
-                    clean_row['Categoria'] = row.get('Categoria', 'N/A')
-                    clean_row['Cookies'] = row.get('Cookies', 'N/A')
-                    clean_row['Expediente'] = row.get('Expediente', 'N/A')
-                    clean_row['Endereço'] = row.get('Endereço no site', row.get('Endereço', 'N/A'))
-                    clean_row['Analytics'] = row.get('Google analytics ', row.get('Analytics', 'N/A'))
-                    
-                    # Views com limpeza numérica
-                    clean_row['Views Set'] = clean_numeric_value(row.get('Views Setembro', '0'))
-                    clean_row['Views Out'] = clean_numeric_value(row.get('Views Outubro', '0'))
-                    clean_row['Views Nov'] = clean_numeric_value(row.get('Views Novembro', '0'))
-                    clean_row['Média Trimestral'] = clean_numeric_value(row.get('Média Trimestral', '0'))
-                    clean_row['Views Ago'] = clean_numeric_value(row.get('Views Novembro', '0'))  # Usando Nov como Ago
-                    
-                    # Só adicionar se tiver nome válido
-                    if clean_row['Nome do veículo'] != 'N/A' and clean_row['Nome do veículo'].strip():
-                        data.append(clean_row)
-                
-                if len(data) > 0:
-                    print(f"Dados carregados do Google Sheets: {len(data)} registros")
-                    return data
-                else:
-                    print(f"Google Sheets retornou dados vazios: {url}")
-                    continue
-                    
-        except Exception as e:
-            print(f"Erro ao carregar dados do Google Sheets ({url}): {e}")
-            continue
-    
+    """Carrega dados diretamente do Google Sheets, buscando as URLs em paralelo.
+
+    Retorna ``(data, fonte)``, com fonte ``"sheets"`` ou ``"local"`` (CSV do
+    repositório, quando todas as URLs falham), ou ``None`` quando o conteúdo da
+    planilha não mudou desde a última carga aceita, para que o snapshot atual
+    seja mantido sem reprocessar o CSV.
+    """
+    # O prazo vale só para os downloads; a conversão do vencedor é feita depois
+    raced = sheets_fetcher.race(parse_sheets_csv, SHEETS_HEDGE_DELAY, SHEETS_DEADLINE, validate=validate_sheets_csv)
+    if raced is not None:
+        result, data = raced
+        if result.not_modified:
+            print(f"Google Sheets sem alterações desde a última carga: {result.url}")
+            return None
+        print(f"Dados carregados do Google Sheets: {len(data)} registros ({result.url}, {result.latency:.2f}s)")
+        return data, "sheets"
+
     # Se todas as tentativas falharam, usar CSV local
     print("Todas as tentativas do Google Sheets falharam, usando CSV local...")
-    return load_data_from_local_csv()
+    sheets_fetcher.forget()
+    return load_data_from_local_csv(), "local"
+
+def load_snapshot_data(current):
+    """Carrega os dados para o cache (``None`` mantém o snapshot atual)"""
+    result = load_data_from_sheets()
+    if result is not None and result[1] == "local" and current is not None and current.source == "sheets":
+        # Google indisponível: o último snapshot da planilha é mais novo que o CSV local
+        print("Mantendo o último snapshot do Google Sheets em vez do CSV local")
+        return None
+    return result
+
+# Cache dos dados (atualizado em segundo plano a cada REFRESH_INTERVAL segundos)
+REFRESH_INTERVAL = int(os.environ.get('REFRESH_INTERVAL', '300'))
+# Arquivo com o último snapshot carregado (lido no boot e compartilhado entre workers)
+SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH', os.path.join(os.path.dirname(__file__), '.cache', 'snapshot.bin'))
+# Intervalo mínimo entre recargas forçadas por /api/refresh
+REFRESH_COOLDOWN = int(os.environ.get('REFRESH_COOLDOWN', '60'))
+REFRESH_REQUESTS = Counter('refresh_requests_total', 'Chamadas de /api/refresh (started, cooldown, running)',
+                           ['result'])
+
+snapshot_cache = SnapshotCache(load_snapshot_data, REFRESH_INTERVAL, SNAPSHOT_PATH)
+snapshot_cache.register('aggregates', lambda snapshot: build_aggregates(snapshot.data))
+snapshot_cache.register('index', lambda snapshot: DataIndex(snapshot.data))
+snapshot_cache.register('coverage', lambda snapshot: Coverage(snapshot.data, snapshot.derived['index']))
+
+def build_search(snapshot):
+    """Índice de busca; reaproveita o do snapshot anterior se as linhas antigas não mudaram de posição"""
+    previous = snapshot.previous
+    base = previous.derived.get('search') if previous is not None else None
+    return SearchIndex(snapshot.data, base, snapshot.changes)
+
+snapshot_cache.register('search', build_search)
 
-# Cache dos dados
-cached_data = []
-last_update = None
-data_source = "local"
+# Acima disso a lista completa de /api/data não fica pronta em memória (seriam
+# centenas de MB por worker): sai em fluxo, convertida e comprimida aos poucos
+PREPARED_DATA_MAX_ROWS = int(os.environ.get('PREPARED_DATA_MAX_ROWS', '50000'))
+
+def prepare_responses(snapshot):
+    """Respostas mais pedidas já serializadas e comprimidas para o snapshot"""
+    index = snapshot.derived['index']
+    aggregates = dict(snapshot.derived['aggregates'])
+    aggregates['version'] = snapshot.version
+    data = snapshot.data
+    return {
+        # Montada só na primeira requisição; None: grande demais, sai em fluxo
+        'data': LazyPreparedResponse(data.to_records) if len(data) <= PREPARED_DATA_MAX_ROWS else None,
+        'filters': PreparedResponse({param: index.values(column) for param, column in FILTER_FIELDS.items()}),
+        'aggregates': PreparedResponse(aggregates),
+        'desertos': PreparedResponse(dict(snapshot.derived['coverage'].report(DEFAULT_UF), version=snapshot.version))
+    }
+
+snapshot_cache.register('responses', prepare_responses)
+
+def send_all_records(snapshot):
+    """Todos os registros (/api/data sem parâmetros), prontos ou em fluxo nos cadastros grandes"""
+    prepared = snapshot.derived['responses']['data']
+    if prepared is not None:
+        return prepared.send(request)
+    # O conteúdo só muda com a versão do snapshot, que é a mesma em todos os workers
+    etag = f'data-{snapshot.version}'
+    if request.if_none_match.contains_weak(etag):
+        CACHE_REQUESTS.inc(cache='prepared_response', result='not_modified')
+        response = Response(status=304)
+    else:
+        CACHE_REQUESTS.inc(cache='prepared_response', result='streamed')
+        data = snapshot.data
+        chunks = stream_json_list(data.to_records(range(start, min(start + CHUNK_ROWS, len(data))))
+                                  for start in range(0, len(data), CHUNK_ROWS))
+        encoding = negotiate_encoding(request, STREAM_ENCODINGS)
+        if encoding:
+            chunks = compress_stream(chunks, encoding)
+        response = Response(chunks, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Diferenças entre versões para os dashboards abertos (/api/changes)
+change_feed = ChangeFeed()
+snapshot_cache.add_listener(change_feed.publish)
+# Conexões SSE simultâneas por processo. Cada uma ocupa uma thread do worker
+# por até CHANGE_STREAM_SECONDS, então vêm desligadas (o dashboard consulta
+# /api/changes periodicamente); ao ligar, aumente GUNICORN_THREADS junto.
+MAX_CHANGE_STREAMS = int(os.environ.get('MAX_CHANGE_STREAMS', '0'))
+change_streams = threading.BoundedSemaphore(MAX_CHANGE_STREAMS)
+# Duração máxima de uma conexão SSE (o navegador reconecta com Last-Event-ID)
+CHANGE_STREAM_SECONDS = 300
+CHANGE_STREAM_HEARTBEAT = 25
+
+# Relatórios PDF/HTML renderizados em segundo plano e guardados por versão e filtros
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', '2'))
+# Tempo que a requisição espera pelo relatório antes de responder 202 (o cliente tenta de novo)
+REPORT_WAIT = 20
+report_cache = ReportCache(REPORT_WORKERS)
+snapshot_cache.add_listener(lambda snapshot, previous: report_cache.discard_older(snapshot.version))
+
+# Exportações em andamento por processo (cada uma ocupa uma thread do worker)
+MAX_EXPORTS = int(os.environ.get('MAX_EXPORTS', '2'))
+exports = threading.BoundedSemaphore(MAX_EXPORTS)
+
+def snapshot_gauge(read):
+    """Gauge calculado na leitura a partir do snapshot atual (sem disparar carga)"""
+    def function():
+        snapshot = snapshot_cache.snapshot
+        return {} if snapshot is None else {(snapshot.source,): read(snapshot)}
+    return function
+
+Gauge('snapshot_age_seconds', 'Idade do snapshot servido', ['source'], snapshot_gauge(lambda s: round(s.age(), 3)))
+Gauge('snapshot_check_age_seconds', 'Tempo desde a última verificação da fonte', ['source'],
+      snapshot_gauge(lambda s: round(s.since_check(), 3)))
+Gauge('snapshot_rows', 'Registros no snapshot servido', ['source'], snapshot_gauge(lambda s: len(s.data)))
+Gauge('snapshot_version', 'Versão do snapshot servido', ['source'], snapshot_gauge(lambda s: s.version))
+Gauge('snapshot_load_duration_seconds', 'Duração da carga do snapshot servido', ['source'],
+      snapshot_gauge(lambda s: round(s.load_duration, 3)))
+
+# Diretório em que cada worker grava as suas métricas para /metrics somar todos
+# (o gunicorn.conf.py define um padrão; sem ele, /metrics mostra só o processo)
+METRICS_DIR = os.environ.get('METRICS_DIR')
+if METRICS_DIR:
+    enable_multiprocess(METRICS_DIR)
+
+def current_snapshot():
+    """Retorna o snapshot atual, carregando-o apenas na primeira vez"""
+    return snapshot_cache.get()
+
+def snapshot_info(snapshot):
+    """Metadados do snapshot para as respostas da API"""
+    return {
+        'timestamp': snapshot.loaded_at.isoformat(),
+        'snapshot_age_seconds': round(snapshot.age(), 1),
+        'load_duration_seconds': round(snapshot.load_duration, 3),
+        'refreshing': snapshot_cache.is_refreshing()
+    }
+
+# Parâmetros que ativam a resposta paginada de /api/data
+QUERY_PARAMS = set(FILTER_FIELDS) | {'q', 'sort', 'order', 'limit', 'offset', 'facets'}
+DEFAULT_PAGE_SIZE = 150
+MAX_PAGE_SIZE = 1000
+
+def parse_filters(args):
+    """Converte os parâmetros cidade/status/categoria em ``{coluna: [valores]}``"""
+    filters = {}
+    for param, column in FILTER_FIELDS.items():
+        values = [value for value in args.getlist(param) if value.strip() and value != 'all']
+        if values:
+            filters[column] = values
+    return filters
+
+def parse_sort(args):
+    """Retorna ``(coluna, decrescente)``; aceita ``sort=-coluna`` ou ``order=desc``"""
+    sort = args.get('sort', '').strip()
+    if not sort:
+        return None, False
+    descending = sort.startswith('-') or args.get('order', '').lower() == 'desc'
+    sort = sort.lstrip('-')
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Ordenação inválida: {sort}. Use uma de: {', '.join(SORT_FIELDS)}")
+    return sort, descending
+
+def select_rows(snapshot, args):
+    """Posições dos registros que atendem aos filtros, busca e ordenação pedidos"""
+    index = snapshot.derived['index']
+    sort, descending = parse_sort(args)
+    positions = index.match(parse_filters(args))
+    
+    query = args.get('q', '').strip()
+    if query:
+        # Sem ordenação explícita, os resultados da busca seguem a relevância
+        ranked = snapshot.derived['search'].search(query, positions=positions)
+        positions = np.zeros(len(snapshot.data), dtype=bool)
+        positions[ranked] = True
+        if sort is None:
+            return ranked, positions
+    
+    return index.ordered(positions, sort, descending), positions
 
 @app.route('/')
 def index():
@@ -183,115 +324,344 @@ def index():
 
 @app.route('/api/data')
 def get_data():
-    """API para obter todos os dados"""
-    global cached_data, last_update, data_source
+    """API para obter os dados.
     
-    # Recarregar dados se não existirem ou se passaram mais de 5 minutos
-    current_time = datetime.now()
-    if not cached_data or not last_update or (current_time - last_update).seconds > 300:
-        cached_data = load_data_from_sheets()
-        last_update = current_time
-        
-        # Determinar fonte dos dados
-        if len(cached_data) > 0:
-            # Verificar se conseguiu carregar do Google Sheets (mais de 130 registros indica sucesso)
-            data_source = "sheets" if len(cached_data) > 130 else "local"
-        else:
-            data_source = "local"
+    Sem parâmetros retorna todos os registros. Com filtros (cidade, status,
+    categoria, q), ordenação (sort, order) ou paginação (limit, offset) retorna
+    uma página com o total de resultados e, se ``facets=1``, as contagens do
+    conjunto filtrado.
+    """
+    snapshot = current_snapshot()
+    if not QUERY_PARAMS.intersection(request.args):
+        return send_all_records(snapshot)
+    
+    try:
+        ordered, positions = select_rows(snapshot, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify(cached_data)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1:
+        # Com limit=0 o next_offset seria o próprio offset e o cliente não sairia do lugar
+        return jsonify({'error': f'limit inválido: {limit}. Use um valor de 1 a {MAX_PAGE_SIZE}'}), 400
+    limit = min(limit, MAX_PAGE_SIZE)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    page = ordered[offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(ordered) else None
+    
+    response = {
+        'items': snapshot.data.to_records(page),
+        'total': len(ordered),
+        'offset': offset,
+        'limit': limit,
+        'next_offset': next_offset,
+        'version': snapshot.version
+    }
+    if request.args.get('facets') in ('1', 'true'):
+        response['facets'] = snapshot.derived['index'].facets(positions)
+    return jsonify(response)
+
+@app.route('/api/filters')
+def get_filters():
+    """API com os valores disponíveis para cada filtro"""
+    return current_snapshot().derived['responses']['filters'].send(request)
+
+def source_label(snapshot):
+    """Nome da fonte dos dados exibido no dashboard"""
+    return "Google Sheets" if snapshot.source == "sheets" else "Arquivo local"
+
+@app.route('/api/meta')
+def get_meta():
+    """API leve com os metadados do snapshot atual (sem os registros)"""
+    snapshot = current_snapshot()
+    # Versão gravada por outro worker (ex.: após /api/refresh) é adotada para as próximas consultas
+    snapshot_cache.adopt_async()
+    meta = {
+        'source': snapshot.source,
+        'source_text': source_label(snapshot),
+        'total_records': len(snapshot.data),
+        'version': snapshot.version,
+        # Se o dashboard pode usar /api/changes/stream em vez de consultar /api/changes
+        'live_updates': MAX_CHANGE_STREAMS > 0
+    }
+    meta.update(snapshot_info(snapshot))
+    return jsonify(meta)
 
 @app.route('/api/refresh')
 def refresh_data():
-    """API para forçar atualização dos dados"""
-    global cached_data, last_update, data_source
+    """API para forçar atualização dos dados (com intervalo mínimo entre recargas).
+
+    O intervalo vale para todos os workers (horário da última verificação no
+    arquivo de snapshot) e a recarga roda em segundo plano: a requisição
+    retorna na hora com o snapshot atual.
+    """
+    snapshot = current_snapshot()
+    since_check = snapshot_cache.since_check()
+    started = False
     
-    print("Forçando atualização dos dados...")
-    cached_data = load_data_from_sheets()
-    last_update = datetime.now()
+    snapshot_cache.adopt_async()
+    if snapshot_cache.is_refreshing(shared=True):
+        REFRESH_REQUESTS.inc(result='running')
+        message = 'Atualização já em andamento; exibindo os dados atuais.'
+    elif since_check is not None and since_check < REFRESH_COOLDOWN:
+        REFRESH_REQUESTS.inc(result='cooldown')
+        message = f'Dados verificados há {int(since_check)}s; nova atualização permitida em {int(REFRESH_COOLDOWN - since_check) + 1}s.'
+    else:
+        REFRESH_REQUESTS.inc(result='started')
+        print("Forçando atualização dos dados...")
+        # Se outro worker verificar a fonte enquanto isso, o snapshot dele é adotado
+        snapshot_cache.refresh_async(force=True, min_interval=REFRESH_COOLDOWN)
+        started = True
+        message = 'Atualização iniciada; os dados são exibidos assim que a carga terminar.'
     
-    # Determinar fonte dos dados
-    if len(cached_data) > 0:
-        data_source = "sheets" if len(cached_data) > 130 else "local"
+    response = {
+        'success': True,
+        'message': message,
+        'skipped': not started,
+        'started': started,
+        'total_records': len(snapshot.data),
+        'source': source_label(snapshot),
+        'version': snapshot.version
+    }
+    response.update(snapshot_info(snapshot))
+    response['refreshing'] = started or response['refreshing']
+    return jsonify(response)
+
+def parse_version(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+@app.route('/api/changes')
+def get_changes():
+    """API com as diferenças publicadas depois da versão ``since``.
+
+    ``reset`` indica que a versão do cliente não pode ser atualizada pelas
+    diferenças guardadas e que os dados devem ser recarregados.
+    """
+    current_snapshot()
+    since = parse_version(request.args.get('since'))
+    entries = change_feed.since(since) if since is not None else []
+    return jsonify({
+        'version': change_feed.version,
+        'reset': entries is None,
+        'changes': entries or []
+    })
+
+@app.route('/api/changes/stream')
+def stream_changes():
+    """Server-sent events com as diferenças a partir de ``since`` (ou Last-Event-ID)"""
+    current_snapshot()
+    if not change_streams.acquire(blocking=False):
+        response = jsonify({'error': 'Muitas conexões abertas; use /api/changes'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(CHANGE_STREAM_HEARTBEAT)
+        return response
+    since = parse_version(request.headers.get('Last-Event-ID') or request.args.get('since'))
+
+    def event(name, version, payload):
+        return f"id: {version}\nevent: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def events():
+        version = since
+        yield f"retry: {CHANGE_STREAM_HEARTBEAT * 1000}\n\n"
+        if version is None:
+            version = change_feed.version
+            yield event('version', version, {'version': version})
+        deadline = time.monotonic() + CHANGE_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            entries = change_feed.since(version)
+            if entries is None:
+                version = change_feed.version
+                yield event('reset', version, {'version': version})
+            elif entries:
+                for entry in entries:
+                    yield event('change', entry['version'], entry)
+                version = entries[-1]['version']
+            elif not change_feed.wait(version, CHANGE_STREAM_HEARTBEAT):
+                yield ": keepalive\n\n"
+
+    response = Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Liberada quando o servidor fecha a resposta, mesmo se o cliente sair antes do primeiro evento
+    response.call_on_close(change_streams.release)
+    return response
+
+def render_report(snapshot, args, report_format):
+    """Gera o relatório (executado no pool de relatórios); retorna ``(corpo, etag)``"""
+    ordered, selection = select_rows(snapshot, args)
+    filters = parse_filters(args)
+    coverage = snapshot.derived['coverage'].report(
+        DEFAULT_UF, {column: values for column, values in filters.items() if column in COVERAGE_FILTERS.values()})
+    report = report_data(snapshot, ordered, selection, filters, args.get('q', '').strip(), coverage)
+    if report_format == 'pdf':
+        body = render_pdf(report)
     else:
-        data_source = "local"
+        with app.app_context():
+            body = render_template('report.html', **html_context(report)).encode('utf-8')
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+@app.route('/api/report')
+def get_report():
+    """Relatório em PDF (``format=pdf``) ou HTML (``format=html``) com os mesmos filtros de /api/data"""
+    report_format = request.args.get('format', 'pdf')
+    if report_format not in REPORT_FORMATS:
+        return jsonify({'error': f"Formato inválido: {report_format}. Use um de: {', '.join(REPORT_FORMATS)}"}), 400
+    try:
+        sort = parse_sort(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    source_text = "Google Sheets" if data_source == "sheets" else "Arquivo local"
+    snapshot = current_snapshot()
+    args = request.args.copy()
+    filters = tuple(sorted((column, tuple(sorted(values))) for column, values in parse_filters(args).items()))
+    key = (snapshot.version, report_format, filters, args.get('q', '').strip().casefold(), sort)
+    future = report_cache.get(key, lambda: render_report(snapshot, args, report_format))
+    if future is None:
+        return jsonify({'error': 'Muitos relatórios em geração, tente novamente em instantes'}), 503, {'Retry-After': '5'}
+    try:
+        body, etag = future.result(timeout=REPORT_WAIT)
+    except FutureTimeout:
+        return jsonify({'status': 'gerando'}), 202, {'Retry-After': '2'}
+    except Exception as e:
+        print(f"Erro ao gerar relatório: {e}")
+        return jsonify({'error': 'Erro ao gerar relatório'}), 500
+    
+    response = Response(body, content_type=REPORT_FORMATS[report_format])
+    if report_format == 'pdf':
+        response.headers['Content-Disposition'] = f'attachment; filename="relatorio-veiculos-{snapshot.version}.pdf"'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/export')
+def export_data():
+    """Exportação em fluxo (``format=csv|jsonl|parquet``) com os filtros de /api/data e ``columns``"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Formato inválido: {export_format}. Use um de: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    snapshot = current_snapshot()
+    try:
+        columns = parse_columns(snapshot.data, request.args.getlist('columns'))
+        ordered, _ = select_rows(snapshot, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not exports.acquire(blocking=False):
+        return jsonify({'error': 'Muitas exportações em andamento, tente novamente em instantes'}), 429
     
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    chunks = generate_export(export_format, snapshot.data, ordered, columns)
+    encoding = negotiate_encoding(request, STREAM_ENCODINGS) if export_format != 'parquet' else None
+    if encoding:
+        chunks = compress_stream(chunks, encoding)
+    response = Response(chunks, content_type=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    response.headers['Content-Disposition'] = f'attachment; filename="veiculos-{snapshot.version}.{extension}"'
+    response.headers['X-Total-Count'] = str(len(ordered))
+    # Liberada quando o servidor fecha a resposta, mesmo se o download for interrompido
+    response.call_on_close(exports.release)
+    return response
+
+@app.route('/api/export/columns')
+def get_export_columns():
+    """Colunas disponíveis na exportação (normalizadas e originais da planilha)"""
+    return jsonify({'columns': export_columns(current_snapshot().data), 'formats': list(EXPORT_FORMATS)})
+
+@app.route('/metrics')
+def get_metrics():
+    """Métricas de todos os workers no formato do Prometheus"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/sources')
+def get_sources():
+    """API com a taxa de sucesso e a latência de cada URL do Google Sheets"""
     return jsonify({
-        'success': True,
-        'message': f'Dados atualizados com sucesso do {source_text}. {len(cached_data)} registros carregados.',
-        'timestamp': last_update.isoformat(),
-        'total_records': len(cached_data),
-        'source': source_text
+        'urls': sheets_fetcher.stats(),
+        'order': sheets_fetcher.ranked_urls()
     })
 
 @app.route('/api/stats')
 def get_stats():
     """API para obter estatísticas dos dados"""
-    global cached_data, data_source
-    
-    if not cached_data:
-        cached_data = load_data_from_sheets()
+    snapshot = current_snapshot()
     
-    if not cached_data:
+    if not snapshot.data:
         return jsonify({'error': 'Nenhum dado disponível'})
     
-    # Calcular estatísticas manualmente
-    total_veiculos = len(cached_data)
+    # Estatísticas pré-calculadas quando o snapshot foi carregado
+    aggregates = snapshot.derived['aggregates']
     
-    # Contar status
-    status_counts = {}
-    for item in cached_data:
-        status = item.get('Status', 'N/A')
-        status_counts[status] = status_counts.get(status, 0) + 1
-    
-    # Contar categorias
-    categoria_counts = {}
-    for item in cached_data:
-        categoria = item.get('Categoria', 'N/A')
-        categoria_counts[categoria] = categoria_counts.get(categoria, 0) + 1
-    
-    # Contar cidades
-    cidades_set = set()
-    for item in cached_data:
-        cidade = item.get('Cidade', 'N/A')
-        if cidade != 'N/A':
-            cidades_set.add(cidade)
-    
-    source_text = "Google Sheets" if data_source == "sheets" else f"Arquivo local ({len(cached_data)} registros)"
+    source_text = "Google Sheets" if snapshot.source == "sheets" else f"Arquivo local ({len(snapshot.data)} registros)"
     
     stats = {
-        'total_veiculos': total_veiculos,
-        'total_cidades': len(cidades_set),
-        'status_counts': status_counts,
-        'categoria_counts': categoria_counts,
+        'total_veiculos': aggregates['total_veiculos'],
+        'total_cidades': aggregates['total_cidades'],
+        'status_counts': aggregates['status_counts'],
+        'categoria_counts': aggregates['categoria_counts'],
         'data_source': source_text
     }
+    stats.update(snapshot_info(snapshot))
     
     return jsonify(stats)
 
+@app.route('/api/aggregates')
+def get_aggregates():
+    """API com todos os agregados do snapshot (contagens, cruzamento, somas mensais)"""
+    return current_snapshot().derived['responses']['aggregates'].send(request)
+
+@app.route('/api/desertos')
+def get_desertos():
+    """API com a cobertura por município (desertos de mídia); aceita ``uf``, ``status`` e ``categoria``"""
+    snapshot = current_snapshot()
+    uf = request.args.get('uf', DEFAULT_UF).strip() or DEFAULT_UF
+    filters = {column: values for column, values in parse_filters(request.args).items()
+               if column in COVERAGE_FILTERS.values()}
+    if uf.upper() == DEFAULT_UF and not filters:
+        return snapshot.derived['responses']['desertos'].send(request)
+    
+    try:
+        report = snapshot.derived['coverage'].report(uf, filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    report['version'] = snapshot.version
+    return jsonify(report)
+
+@app.route('/api/top-trimestral')
+def get_top_trimestral():
+    """API com o ranking de veículos por Média Trimestral"""
+    limit = request.args.get('limit', 10, type=int)
+    top = current_snapshot().derived['aggregates']['top_trimestral']
+    return jsonify(top[:max(0, min(limit, TOP_SIZE))])
+
 @app.route('/api/search')
 def search_data():
-    """API para buscar dados"""
-    global cached_data
-    
-    if not cached_data:
-        cached_data = load_data_from_sheets()
+    """API para buscar dados por nome, cidade e endereço (sem acentos, tolerante a erros)"""
+    snapshot = current_snapshot()
     
-    query = request.args.get('q', '').lower().strip()
+    query = request.args.get('q', '').strip()
     
     if not query:
-        return jsonify(cached_data)
+        return send_all_records(snapshot)
     
-    # Filtrar dados baseado na busca
-    filtered_data = []
-    for item in cached_data:
-        nome = str(item.get('Nome do veículo', '')).lower()
-        if query in nome:
-            filtered_data.append(item)
-    
-    return jsonify(filtered_data)
+    limit = max(1, min(request.args.get('limit', MAX_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    ranked = snapshot.derived['search'].search(query, limit=limit)
+    return jsonify(snapshot.data.to_records(ranked))
+
+@app.route('/api/autocomplete')
+def autocomplete():
+    """API com sugestões de nomes de veículos para a busca"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 8, type=int), 50))
+    if not query:
+        return jsonify([])
+    return jsonify(current_snapshot().derived['search'].suggest(query, limit))
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Servidor de desenvolvimento; em produção use o gunicorn (gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', '5000')),
+            debug=os.environ.get('FLASK_DEBUG') == '1')
@@ -0,0 +1,325 @@
+"""Métricas do app no formato texto do Prometheus (``/metrics``).
+
+Contadores, gauges e histogramas simples, seguros entre threads e sem
+dependências. Com ``enable_multiprocess(diretório)`` (o gunicorn liga via
+``METRICS_DIR``), cada processo grava as suas amostras em ``<pid>.json`` nesse
+diretório a cada ``FLUSH_INTERVAL`` segundos, e ``render()`` junta os arquivos de
+todos os processos, como o modo multiprocesso do ``prometheus_client``:
+
+- contadores e histogramas são somados, incluindo os de workers que já
+  terminaram (assim os totais não voltam para trás quando um worker é trocado);
+- gauges saem com o rótulo ``pid``, só dos processos vivos.
+
+Os números dos outros workers podem estar até ``FLUSH_INTERVAL`` segundos
+atrasados; os do processo que responde estão sempre em dia.
+
+Uso::
+
+    REQUESTS = Counter('app_requests_total', 'Requisições', ['route'])
+    REQUESTS.inc(route='/api/data')
+
+    with LOADER_STAGE.time(stage='normalize'):
+        ...
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites dos histogramas de latência (segundos)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+# Intervalo (segundos) entre as gravações das amostras de cada processo
+FLUSH_INTERVAL = 5
+
+REGISTRY = []
+
+# Diretório compartilhado entre os processos (None: só as métricas deste processo)
+_directory = None
+# Processo que já criou workers (mestre do gunicorn): não atende requisições,
+# então os seus gauges não entram em /metrics
+_forked = False
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name}: rótulos esperados {self.labelnames}, recebidos {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """``(sufixo, nomes dos rótulos, valores dos rótulos, valor)`` de cada série"""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield '', self.labelnames, key, value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Valor atual; ``function`` (opcional) calcula ``{valores dos rótulos: valor}`` na leitura"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function is None:
+            yield from super().samples()
+            return
+        for key, value in (self.function() or {}).items():
+            yield '', self.labelnames, key if isinstance(key, tuple) else (key,), value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mede o bloco ``with`` (também quando ele levanta uma exceção)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items()]
+        names = self.labelnames + ('le',)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield '_bucket', names, key + (_format_value(bound),), cumulative
+            yield '_sum', self.labelnames, key, total
+            yield '_count', self.labelnames, key, count
+
+
+def _collect(registry, gauges=True):
+    """``{nome: [[sufixo, nomes, valores, valor], ...]}`` das métricas deste processo"""
+    return {
+        metric.name: [[suffix, list(names), list(values), value] for suffix, names, values, value in metric.samples()]
+        for metric in registry if gauges or metric.kind != 'gauge'
+    }
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def flush(registry=REGISTRY):
+    """Grava as amostras deste processo no diretório compartilhado (se ligado)"""
+    directory = _directory
+    if directory is None:
+        return
+    pid = os.getpid()
+    path = os.path.join(directory, f'{pid}.json')
+    temp_path = f'{path}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'pid': pid, 'metrics': _collect(registry, gauges=not _forked)}, file)
+        # Troca atômica: quem lê nunca vê um arquivo pela metade
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Erro ao gravar as métricas em {path}: {e}")
+
+
+def _read_all(directory, registry):
+    """Amostras de todos os processos: ``[(pid, {nome: amostras})]``, com as deste processo em dia"""
+    pid = os.getpid()
+    processes = [(pid, _collect(registry, gauges=not _forked))]
+    try:
+        names = os.listdir(directory)
+    except OSError as e:
+        print(f"Erro ao ler as métricas em {directory}: {e}")
+        names = []
+    for name in names:
+        if not name.endswith('.json') or name == f'{pid}.json':
+            continue
+        try:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as file:
+                content = json.load(file)
+        except (OSError, ValueError):
+            # Removido ou trocado durante a leitura; entra na próxima coleta
+            continue
+        processes.append((content['pid'], content['metrics']))
+    return processes
+
+
+def _merge(processes, registry):
+    """``{nome: {(sufixo, nomes, valores): valor}}``; gauges ganham o rótulo ``pid``"""
+    kinds = {metric.name: metric.kind for metric in registry}
+    merged = {name: {} for name in kinds}
+    for pid, metrics in processes:
+        alive = None
+        for name, samples in metrics.items():
+            if name not in merged:
+                continue
+            series = merged[name]
+            if kinds[name] == 'gauge':
+                if alive is None:
+                    alive = pid == os.getpid() or _alive(pid)
+                if not alive:
+                    continue
+                for suffix, names, values, value in samples:
+                    series[(suffix, ('pid',) + tuple(names), (str(pid),) + tuple(values))] = value
+                continue
+            for suffix, names, values, value in samples:
+                key = (suffix, tuple(names), tuple(values))
+                series[key] = series.get(key, 0) + value
+    return merged
+
+
+def render(registry=REGISTRY):
+    """Todas as métricas no formato de exposição texto do Prometheus (0.0.4)"""
+    if _directory is None:
+        processes = [(os.getpid(), _collect(registry))]
+    else:
+        processes = _read_all(_directory, registry)
+    merged = _merge(processes, registry)
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for (suffix, names, values), value in merged[metric.name].items():
+            lines.append(f'{metric.name}{suffix}{_format_labels(names, values)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+def _start_flusher():
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def _before_fork():
+    # As amostras do processo pai (ex.: a carga inicial no mestre do gunicorn)
+    # ficam no arquivo dele; os filhos começam do zero para não contá-las de novo
+    global _forked
+    _forked = True
+    flush()
+
+
+def _after_fork_in_child():
+    global _forked
+    _forked = False
+    for metric in REGISTRY:
+        # O lock pode ter sido copiado travado por outra thread do pai
+        metric._lock = threading.Lock()
+        metric._values = {}
+    _start_flusher()
+
+
+def enable_multiprocess(directory):
+    """Soma as métricas de todos os processos que gravam em ``directory``
+
+    Chame uma vez, antes de criar os workers; os processos filhos herdam a
+    configuração.
+    """
+    global _directory
+    if _directory is not None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _directory = directory
+    _start_flusher()
+    os.register_at_fork(before=_before_fork, after_in_child=_after_fork_in_child)
+
+
+def clear_directory(directory):
+    """Apaga os arquivos de métricas de execuções anteriores (no início do servidor)"""
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith('.json') or name.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+# Métricas compartilhadas pelos módulos do app
+
+HTTP_REQUESTS = Histogram('http_request_duration_seconds', 'Tempo de resposta por rota (até o início do corpo)',
+                          ['route', 'method', 'status'])
+SHEETS_FETCH = Histogram('sheets_fetch_duration_seconds', 'Download de cada URL do Google Sheets',
+                         ['url', 'result'], buckets=STAGE_BUCKETS)
+LOADER_STAGE = Histogram('loader_stage_duration_seconds',
+                         'Etapas da carga: fetch, normalize, encode, diff, persist e a carga completa (total)',
+                         ['stage'], buckets=STAGE_BUCKETS)
+SNAPSHOT_BUILD = Histogram('snapshot_build_duration_seconds',
+                           'Construção das estruturas derivadas de cada snapshot (índices, agregados, respostas)',
+                           ['builder'], buckets=STAGE_BUCKETS)
+SNAPSHOT_RELOADS = Counter('snapshot_reloads_total',
+                           'Recargas por resultado (loaded, unchanged, adopted, restored, error)', ['result'])
+CACHE_REQUESTS = Counter('cache_requests_total', 'Acertos e faltas dos caches do app', ['cache', 'result'])
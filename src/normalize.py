@@ -0,0 +1,220 @@
+"""Normalização única das linhas do cadastro (CSV local e Google Sheets).
+
+O CSV é lido em uma só passada. Os apelidos de cabeçalho são resolvidos uma
+vez por arquivo, não uma vez por linha. O resultado são colunas tipadas:
+textos como ``str`` e números como ``int``/``float``, com ``None`` para valor
+ausente.
+"""
+import csv
+import io
+import re
+
+# Coluna normalizada -> cabeçalhos aceitos na planilha, em ordem de preferência
+COLUMN_ALIASES = {
+    'Nome do veículo': ['Nome do veículo.\n', 'Nome do veículo', 'Nome'],
+    'Cidade': ['Cidade'],
+    'Status': ['Status'],
+    'Categoria': ['Categoria'],
+    'Cookies': ['Cookies'],
+    'Expediente': ['Expediente'],
+    'Endereço': ['Endereço no site', 'Endereço'],
+    'Analytics': ['Google analytics ', 'Analytics'],
+    'Views Set': ['Views Setembro'],
+    'Views Out': ['Views Outubro'],
+    'Views Nov': ['Views Novembro'],
+    'Média Trimestral': ['Média Trimestral'],
+    'Views Ago': ['Views Novembro'],  # Usando Nov como Ago
+    'URL': ['URL ativa do veículo.', 'URL'],
+}
+
+# Colunas guardadas no snapshot (ex.: para o dashboard Dash) mas fora dos registros da API
+SNAPSHOT_ONLY_COLUMNS = ['URL']
+
+# Data/hora da resposta do Google Forms (primeira coluna da planilha): identifica
+# cada cadastro entre cargas, mesmo que outras colunas sejam editadas
+KEY_ALIASES = ['f', 'Carimbo de data/hora', 'Timestamp']
+KEY_COLUMN = 'Carimbo de data/hora'
+
+NUMERIC_COLUMNS = ['Views Set', 'Views Out', 'Views Nov', 'Média Trimestral', 'Views Ago']
+TEXT_COLUMNS = [column for column in COLUMN_ALIASES if column not in NUMERIC_COLUMNS]
+
+# Ordem das chaves nos registros retornados pela API
+RECORD_COLUMNS = [column for column in COLUMN_ALIASES if column not in SNAPSHOT_ONLY_COLUMNS]
+
+MISSING_MARKERS = {'não tem analytics', 'n/a', 'nan', ''}
+
+NON_NUMERIC = re.compile(r'[^\d.,]')
+DOT_THOUSANDS = re.compile(r'\d{1,3}(?:\.\d{3})+')
+COMMA_THOUSANDS = re.compile(r'\d{1,3}(?:,\d{3}){2,}')
+
+
+def parse_number(value):
+    """Converte números no formato brasileiro; ``None`` se não for numérico.
+
+    "1.234.567" -> 1234567, "1.026,5" -> 1026.5, "950" -> 950
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if text.lower() in MISSING_MARKERS:
+        return None
+
+    cleaned = NON_NUMERIC.sub('', text)
+    if ',' in cleaned:
+        if COMMA_THOUSANDS.fullmatch(cleaned):
+            cleaned = cleaned.replace(',', '')
+        else:
+            cleaned = cleaned.replace('.', '').replace(',', '.')
+    elif DOT_THOUSANDS.fullmatch(cleaned):
+        cleaned = cleaned.replace('.', '')
+
+    try:
+        number = float(cleaned)
+    except ValueError:
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def header_key(header):
+    return header.strip().rstrip('.').strip().casefold()
+
+
+def resolve_columns(header):
+    """Índices das colunas de origem para cada coluna normalizada (e a da chave).
+
+    Procura primeiro o cabeçalho exato e depois uma versão sem espaços,
+    pontos finais e maiúsculas. Retorna uma lista de índices por coluna (vazia
+    se a coluna não existir no arquivo).
+    """
+    exact = {}
+    relaxed = {}
+    for i, name in enumerate(header):
+        exact.setdefault(name, i)
+        relaxed.setdefault(header_key(name), i)
+
+    resolved = {}
+    for column, aliases in [*COLUMN_ALIASES.items(), (KEY_COLUMN, KEY_ALIASES)]:
+        indices = []
+        for alias in aliases:
+            i = exact.get(alias, relaxed.get(header_key(alias)))
+            if i is not None and i not in indices:
+                indices.append(i)
+        resolved[column] = indices
+    return resolved
+
+
+def source_names(header, indices):
+    """Nomes das colunas de origem ``indices`` (sem quebras de linha, únicos)"""
+    taken = set(COLUMN_ALIASES)
+    names = []
+    for i in indices:
+        base = ' '.join(header[i].split()) or f'Coluna {i + 1}'
+        name = base
+        count = 1
+        while name in taken:
+            count += 1
+            name = f'{base} ({count})'
+        taken.add(name)
+        names.append(name)
+    return names
+
+
+def row_keys(stamps, names):
+    """Chave estável de cada linha: data/hora da resposta, ou o nome se não houver.
+
+    Chaves repetidas recebem um sufixo com a ordem de aparição ("...#2").
+    """
+    keys = []
+    seen = {}
+    for stamp, name in zip(stamps, names):
+        key = (stamp or '').strip() or str(name).strip()
+        count = seen.get(key, 0) + 1
+        seen[key] = count
+        keys.append(key if count == 1 else f'{key}#{count}')
+    return keys
+
+
+class NormalizedTable:
+    """Colunas tipadas de um CSV normalizado, com a chave de cada linha.
+
+    ``extras`` guarda, como texto original, as colunas da planilha que não
+    têm coluna normalizada (ex.: CNPJ, Usuários ativos, HTTPS).
+    """
+
+    def __init__(self, columns, length, keys=None, extras=None):
+        self.columns = columns
+        self.length = length
+        self.keys = keys if keys is not None else row_keys([None] * length, columns['Nome do veículo'])
+        self.extras = extras if extras is not None else {}
+
+    def __len__(self):
+        return self.length
+
+    def records(self):
+        """Registros no formato da API (``'N/A'`` para valores ausentes)"""
+        columns = [(name, self.columns[name]) for name in RECORD_COLUMNS]
+        return [
+            {name: ('N/A' if values[i] is None else values[i]) for name, values in columns}
+            for i in range(self.length)
+        ]
+
+
+def normalize_csv(source):
+    """Lê o CSV (texto ou arquivo aberto) e retorna uma ``NormalizedTable``.
+
+    Linhas sem nome de veículo são descartadas.
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    reader = csv.reader(source)
+    header = next(reader, None)
+    if header is None:
+        return NormalizedTable({column: [] for column in COLUMN_ALIASES}, 0)
+
+    resolved = resolve_columns(header)
+    name_indices = resolved['Nome do veículo']
+    key_index = resolved[KEY_COLUMN][0] if resolved[KEY_COLUMN] else None
+    text_sources = [(resolved[column][0] if resolved[column] else None, []) for column in TEXT_COLUMNS[1:]]
+    # Colunas numéricas com a mesma origem (Views Nov/Ago) são convertidas uma só vez
+    numeric_sources = {}
+    for column in NUMERIC_COLUMNS:
+        index = resolved[column][0] if resolved[column] else None
+        numeric_sources.setdefault(index, []).append(column)
+    numeric_values = {index: [] for index in numeric_sources}
+    mapped = {i for column in COLUMN_ALIASES for i in resolved[column]}
+    extra_indices = [i for i in range(len(header)) if i not in mapped]
+    extra_sources = [(i, []) for i in extra_indices]
+
+    names = []
+    stamps = []
+    parsed = {}
+    for row in reader:
+        width = len(row)
+        name = None
+        for i in name_indices:
+            if i < width and row[i]:
+                name = row[i]
+                break
+        if name is None or not name.strip() or name == 'N/A':
+            continue
+
+        names.append(name)
+        stamps.append(row[key_index] if key_index is not None and key_index < width else None)
+        for index, values in text_sources:
+            values.append(None if index is None else (row[index] if index < width else ''))
+        for index, values in numeric_values.items():
+            raw = row[index] if index is not None and index < width else None
+            if raw not in parsed:
+                parsed[raw] = parse_number(raw)
+            values.append(parsed[raw])
+        for index, values in extra_sources:
+            values.append(row[index] if index < width else '')
+
+    columns = {'Nome do veículo': names}
+    for column, (index, values) in zip(TEXT_COLUMNS[1:], text_sources):
+        columns[column] = values
+    for index, targets in numeric_sources.items():
+        for column in targets:
+            columns[column] = numeric_values[index]
+    extras = dict(zip(source_names(header, extra_indices), (values for _, values in extra_sources)))
+    return NormalizedTable(columns, len(names), row_keys(stamps, names), extras)
@@ -0,0 +1,123 @@
+"""Gerador mínimo de PDF vetorial (texto e retângulos), sem dependências.
+
+Usa as fontes padrão Helvetica e Helvetica-Bold, que todo leitor de PDF tem,
+com a codificação WinAnsi (cp1252): acentos do português funcionam e
+caracteres fora dela (ex.: emojis em nomes) são omitidos. O conteúdo de cada
+página é comprimido com zlib.
+"""
+import zlib
+
+# A4 em pontos
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+
+FONTS = {False: 'F1', True: 'F2'}
+
+# Larguras aproximadas da Helvetica (fração do tamanho da fonte); dígitos são exatos
+_NARROW = set("il.,:;'|!ÍÌÎÏíìîï()[]/ ")
+_WIDE = set('mwMWÆæŒœ%@')
+
+
+def text_width(text, size):
+    """Largura estimada de ``text`` em pontos"""
+    width = 0.0
+    for char in text:
+        if char.isdigit():
+            width += 0.556
+        elif char in _NARROW:
+            width += 0.278
+        elif char in _WIDE:
+            width += 0.86
+        elif char.isupper():
+            width += 0.68
+        else:
+            width += 0.53
+    return width * size
+
+
+def fit_text(text, size, max_width):
+    """Corta o texto com reticências para caber em ``max_width``"""
+    text = encodable(text)
+    if text_width(text, size) <= max_width:
+        return text
+    while text and text_width(text + '...', size) > max_width:
+        text = text[:-1]
+    return text.rstrip() + '...'
+
+
+def encodable(text):
+    """Apenas os caracteres representáveis na codificação das fontes"""
+    return str(text).encode('cp1252', 'ignore').decode('cp1252')
+
+
+def _escape(text):
+    raw = encodable(text).encode('cp1252')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _color(rgb):
+    return ' '.join(f'{channel / 255:.3f}' for channel in rgb).encode('ascii')
+
+
+class PdfDocument:
+    """Páginas A4 com coordenadas a partir do canto superior esquerdo"""
+
+    def __init__(self, width=PAGE_WIDTH, height=PAGE_HEIGHT):
+        self.width = width
+        self.height = height
+        self.pages = []
+        self.add_page()
+
+    def add_page(self):
+        self.pages.append([])
+
+    def _draw(self, *operations):
+        self.pages[-1].extend(operations)
+
+    def text(self, x, y, text, size=10, bold=False, color=(0, 0, 0)):
+        """Escreve ``text`` com a linha de base em ``y``"""
+        self._draw(b'BT /' + FONTS[bold].encode('ascii') + b' %.2f Tf ' % size + _color(color) + b' rg',
+                   b'%.2f %.2f Td (' % (x, self.height - y) + _escape(text) + b') Tj ET')
+
+    def text_right(self, x, y, text, size=10, bold=False, color=(0, 0, 0)):
+        """Escreve ``text`` alinhado à direita em ``x``"""
+        self.text(x - text_width(encodable(text), size), y, text, size, bold, color)
+
+    def rect(self, x, y, width, height, color):
+        """Retângulo preenchido com o canto superior esquerdo em ``(x, y)``"""
+        self._draw(_color(color) + b' rg %.2f %.2f %.2f %.2f re f' % (x, self.height - y - height, width, height))
+
+    def line(self, x1, y1, x2, y2, color=(200, 200, 200), width=0.5):
+        self._draw(_color(color) + b' RG %.2f w %.2f %.2f m %.2f %.2f l S'
+                   % (width, x1, self.height - y1, x2, self.height - y2))
+
+    def to_bytes(self):
+        """Documento PDF completo"""
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            None,  # páginas, preenchido abaixo
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        ]
+        page_ids = []
+        for operations in self.pages:
+            content = zlib.compress(b'\n'.join(operations))
+            objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content) + content + b'\nendstream')
+            objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] '
+                           b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+                           % (self.width, self.height, len(objects)))
+            page_ids.append(len(objects))
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+        objects[1] = b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % len(page_ids)
+
+        output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        xref = len(output)
+        output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        for offset in offsets:
+            output += b'%010d 00000 n \n' % offset
+        output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(output)
@@ -0,0 +1,94 @@
+"""Profiler por amostragem para requisições lentas (opcional).
+
+Enquanto há requisições em andamento, uma thread lê a pilha de cada uma a cada
+``interval`` segundos (``sys._current_frames``), sem instrumentar o código.
+Quando uma requisição termina acima do limite, as pilhas amostradas são
+gravadas no formato "collapsed" (uma pilha por linha, com a contagem), que
+ferramentas de flame graph como ``flamegraph.pl`` e speedscope leem.
+
+Ativado com ``PROFILE_SLOW_REQUESTS=<segundos>`` (ver ``main.py``); sem a
+variável, nada roda.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Profundidade máxima de cada pilha amostrada
+MAX_DEPTH = 64
+
+
+def collapse(frame):
+    """Pilha do frame como ``arquivo:função:linha;...`` (da raiz para o topo)"""
+    parts = []
+    while frame is not None and len(parts) < MAX_DEPTH:
+        code = frame.f_code
+        parts.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+
+class SlowRequestProfiler:
+    """Amostra as threads com requisições em andamento e guarda as amostras das lentas"""
+
+    def __init__(self, threshold, directory, interval=0.005):
+        self.threshold = threshold
+        self.directory = directory
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def begin(self):
+        """Começa a amostrar a thread atual; retorna o identificador para ``end``"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = Counter()
+            # Depois do fork a thread do processo pai não existe mais
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return ident
+
+    def end(self, ident, label, duration):
+        """Para de amostrar; grava as amostras se a requisição passou do limite"""
+        with self._lock:
+            samples = self._active.pop(ident, None)
+        if not samples or duration < self.threshold:
+            return None
+        return self._write(label, duration, samples)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._active
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _write(self, label, duration, samples):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{''.join(c if c.isalnum() else '_' for c in label)[:60]}.txt"
+        path = os.path.join(self.directory, name)
+        total = sum(samples.values())
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(f'# {label} {duration:.3f}s, {total} amostras a cada {self.interval * 1000:.0f}ms\n')
+            for stack, count in samples.most_common():
+                file.write(f'{stack} {count}\n')
+        top = samples.most_common(1)[0][0].rsplit(';', 1)[-1]
+        print(f"Requisição lenta ({label}, {duration:.2f}s): perfil em {path}; mais amostrado: {top}")
+        return path
@@ -0,0 +1,299 @@
+"""Relatórios (PDF e HTML) gerados no servidor.
+
+O conteúdo vem dos índices e agregados já calculados para o snapshot, com os
+mesmos filtros de ``/api/data``. Cada relatório é renderizado uma única vez
+por versão do snapshot, formato e conjunto de filtros, em um pool de threads
+próprio: requisições simultâneas pelo mesmo relatório esperam a mesma
+renderização e as requisições da API não disputam as threads do servidor com
+ela.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from aggregates import MONTH_COLUMNS
+from columnar import NAME_COLUMN, to_python_number
+from metrics import CACHE_REQUESTS
+from pdf_writer import PdfDocument, fit_text, text_width
+
+# Formato -> tipo do conteúdo (Content-Type completo, com charset)
+REPORT_FORMATS = {'pdf': 'application/pdf', 'html': 'text/html; charset=utf-8'}
+
+# Veículos listados na tabela do relatório
+MAX_REPORT_ROWS = 1000
+TOP_SIZE = 10
+TABLE_COLUMNS = [NAME_COLUMN, 'Cidade', 'Status', 'Categoria', 'Média Trimestral']
+
+STATUS_COLORS = {'APROVADO': (39, 174, 96), 'REPROVADO': (231, 76, 60), 'APROVADO PARCIAL': (243, 156, 18)}
+BLUE = (52, 152, 219)
+PURPLE = (155, 89, 182)
+DARK = (44, 62, 80)
+GRAY = (127, 140, 141)
+LIGHT = (245, 247, 250)
+
+
+def format_number(value):
+    """Número no formato brasileiro (``1.234`` ou ``1.234,5``)"""
+    if isinstance(value, str):
+        return value
+    text = f'{value:,.0f}' if float(value).is_integer() else f'{value:,.1f}'
+    return text.replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def _ranked(counts, limit=None):
+    """Pares ``(valor, quantidade)`` do maior para o menor"""
+    items = sorted(counts.items(), key=lambda item: (-item[1], item[0].casefold()))
+    return items[:limit] if limit else items
+
+
+def report_data(snapshot, ordered, selection, filters, query, coverage):
+    """Conteúdo do relatório para as linhas selecionadas (``ordered``/``selection`` de ``select_rows``)"""
+    data = snapshot.data
+    facets = snapshot.derived['index'].facets(selection)
+    mask = np.ones(len(data), dtype=bool) if selection is None else selection
+
+    views_por_mes = {}
+    for column in MONTH_COLUMNS:
+        numeric = data.numerics[column]
+        views_por_mes[column] = to_python_number(numeric.values[mask & ~numeric.missing].sum())
+
+    media = data.numerics['Média Trimestral']
+    by_media = snapshot.derived['index'].ordered(selection, 'Média Trimestral', descending=True)
+    by_media = by_media[~media.missing[by_media] & (media.values[by_media] > 0)][:TOP_SIZE]
+
+    rows = data.to_records(ordered[:MAX_REPORT_ROWS])
+    status_counts = facets['status_counts']
+    return {
+        'version': snapshot.version,
+        'source': snapshot.source,
+        'loaded_at': snapshot.loaded_at,
+        'generated_at': datetime.now(),
+        'filters': filters,
+        'query': query,
+        'total': len(ordered),
+        'kpis': [
+            ('Veículos', len(ordered)),
+            ('Aprovados', status_counts.get('APROVADO', 0)),
+            ('Aprovados parciais', status_counts.get('APROVADO PARCIAL', 0)),
+            ('Reprovados', status_counts.get('REPROVADO', 0)),
+            ('Cidades', len(facets['cidade_counts'])),
+        ],
+        'status': _ranked(status_counts),
+        'categorias': _ranked(facets['categoria_counts']),
+        'cidades': _ranked(facets['cidade_counts'], TOP_SIZE),
+        'views_por_mes': list(views_por_mes.items()),
+        'top_trimestral': [(record[NAME_COLUMN], record['Cidade'], record['Média Trimestral'])
+                           for record in data.to_records(by_media)],
+        'desertos': coverage,
+        'columns': TABLE_COLUMNS,
+        'rows': [[record[column] for column in TABLE_COLUMNS] for record in rows],
+        'rows_truncated': len(ordered) > MAX_REPORT_ROWS,
+    }
+
+
+def describe_filters(report):
+    """Filtros aplicados em uma linha de texto"""
+    parts = [f"{column}: {', '.join(values)}" for column, values in report['filters'].items()]
+    if report['query']:
+        parts.append(f"Busca: \"{report['query']}\"")
+    return '; '.join(parts) or 'Sem filtros (todos os veículos)'
+
+
+def describe_source(report):
+    source = 'Google Sheets' if report['source'] == 'sheets' else 'Arquivo local'
+    return (f"Fonte: {source} - dados de {report['loaded_at']:%d/%m/%Y %H:%M} (versão {report['version']}) - "
+            f"gerado em {report['generated_at']:%d/%m/%Y %H:%M}")
+
+
+def html_context(report):
+    """Variáveis do template ``report.html``"""
+    return {
+        'report': report,
+        'source': describe_source(report),
+        'filters': describe_filters(report),
+        'number': format_number,
+        'status_colors': {label: '#%02x%02x%02x' % rgb for label, rgb in STATUS_COLORS.items()},
+        'max_rows': MAX_REPORT_ROWS,
+    }
+
+
+class _PdfLayout:
+    """Cursor vertical sobre o documento, com quebra de página automática"""
+
+    MARGIN = 40
+
+    def __init__(self):
+        self.doc = PdfDocument()
+        self.left = self.MARGIN
+        self.width = self.doc.width - 2 * self.MARGIN
+        self.y = self.MARGIN
+
+    def ensure(self, height):
+        if self.y + height > self.doc.height - self.MARGIN:
+            self.doc.add_page()
+            self.y = self.MARGIN
+
+    def heading(self, text):
+        self.ensure(40)
+        self.y += 18
+        self.doc.text(self.left, self.y, text, 13, bold=True, color=DARK)
+        self.y += 6
+        self.doc.line(self.left, self.y, self.left + self.width, self.y, color=BLUE, width=1)
+        self.y += 14
+
+    def paragraph(self, text, size=9, color=DARK, bold=False):
+        """Texto com quebra de linha por palavras"""
+        line = ''
+        for word in text.split():
+            candidate = f'{line} {word}'.strip()
+            if line and text_width(candidate, size) > self.width:
+                self.ensure(size + 4)
+                self.doc.text(self.left, self.y, line, size, bold, color)
+                self.y += size + 4
+                line = word
+            else:
+                line = candidate
+        if line:
+            self.ensure(size + 4)
+            self.doc.text(self.left, self.y, line, size, bold, color)
+            self.y += size + 4
+
+    def bars(self, items, color, label_width=150):
+        """Gráfico de barras horizontais ``[(rótulo, valor)]``"""
+        if not items:
+            self.paragraph('Sem dados para os filtros escolhidos.', color=GRAY)
+            return
+        largest = max(value for _, value in items) or 1
+        bar_space = self.width - label_width - 60
+        for label, value in items:
+            self.ensure(16)
+            fill = color(label) if callable(color) else color
+            self.doc.text(self.left, self.y + 9, fit_text(label, 9, label_width - 8), 9, color=DARK)
+            self.doc.rect(self.left + label_width, self.y, max(bar_space * value / largest, 1), 11, fill)
+            self.doc.text(self.left + label_width + bar_space * value / largest + 5, self.y + 9,
+                          format_number(value), 8, color=GRAY)
+            self.y += 16
+
+    def table(self, columns, rows, widths):
+        """Tabela com cabeçalho repetido a cada página"""
+        def header():
+            self.doc.rect(self.left, self.y, self.width, 16, DARK)
+            x = self.left
+            for column, width in zip(columns, widths):
+                self.doc.text(x + 4, self.y + 11, fit_text(column, 8, width - 8), 8, bold=True, color=(255, 255, 255))
+                x += width
+            self.y += 16
+
+        self.ensure(32)
+        header()
+        for number, row in enumerate(rows):
+            if self.y + 14 > self.doc.height - self.MARGIN:
+                self.doc.add_page()
+                self.y = self.MARGIN
+                header()
+            if number % 2:
+                self.doc.rect(self.left, self.y, self.width, 14, LIGHT)
+            x = self.left
+            for value, width in zip(row, widths):
+                text = fit_text(format_number(value) if value is not None else '', 8, width - 8)
+                if isinstance(value, (int, float)):
+                    self.doc.text_right(x + width - 4, self.y + 10, text, 8, color=DARK)
+                else:
+                    self.doc.text(x + 4, self.y + 10, text, 8, color=DARK)
+                x += width
+            self.y += 14
+
+
+def render_pdf(report):
+    """Relatório em PDF vetorial"""
+    layout = _PdfLayout()
+    doc = layout.doc
+    doc.text(layout.left, layout.y + 16, 'Relatório de Veículos de Comunicação - Alagoas', 17, bold=True, color=DARK)
+    layout.y += 30
+    layout.paragraph(describe_source(report), 8, GRAY)
+    layout.paragraph(describe_filters(report), 9, DARK, bold=True)
+
+    # Indicadores
+    layout.y += 8
+    box_width = layout.width / len(report['kpis'])
+    for i, (label, value) in enumerate(report['kpis']):
+        x = layout.left + i * box_width
+        doc.rect(x + 2, layout.y, box_width - 4, 46, LIGHT)
+        doc.text(x + 10, layout.y + 24, format_number(value), 17, bold=True, color=BLUE)
+        doc.text(x + 10, layout.y + 38, label, 8, color=GRAY)
+    layout.y += 54
+
+    layout.heading('Distribuição por Status')
+    layout.bars(report['status'], lambda label: STATUS_COLORS.get(label, GRAY))
+    layout.heading('Top 10 Cidades')
+    layout.bars(report['cidades'], BLUE)
+    layout.heading('Categorias de Audiência')
+    layout.bars(report['categorias'], PURPLE)
+    layout.heading('Visualizações por Mês')
+    layout.bars(report['views_por_mes'], BLUE)
+
+    layout.heading('Top 10 por Média Trimestral')
+    if report['top_trimestral']:
+        layout.table(['Veículo', 'Cidade', 'Média Trimestral'], report['top_trimestral'],
+                     [layout.width * 0.5, layout.width * 0.3, layout.width * 0.2])
+    else:
+        layout.paragraph('Nenhum veículo com Média Trimestral informada.', color=GRAY)
+
+    desertos = report['desertos']
+    layout.heading(f"Desertos de Mídia ({desertos['uf']})")
+    layout.paragraph(f"{len(desertos['desertos'])} desertos (sem veículos), {len(desertos['criticos'])} com cobertura "
+                     f"crítica (1 veículo) e {len(desertos['adequados'])} com cobertura adequada (2+) entre "
+                     f"{desertos['total_municipios']} municípios: {format_number(desertos['percentual_desertos'])}% "
+                     f"de desertos.", 9, DARK, bold=True)
+    layout.paragraph('Desertos: ' + (', '.join(desertos['desertos']) or 'nenhum') + '.', 8)
+    layout.paragraph('Cobertura crítica: ' + (', '.join(item['municipio'] for item in desertos['criticos']) or 'nenhum') + '.', 8)
+
+    layout.heading(f"Veículos ({format_number(report['total'])})")
+    widths = [0.34, 0.2, 0.16, 0.18, 0.12]
+    layout.table(report['columns'], report['rows'], [layout.width * w for w in widths])
+    if report['rows_truncated']:
+        layout.paragraph(f"Lista limitada aos {format_number(MAX_REPORT_ROWS)} primeiros veículos; use a exportação "
+                         f"de dados para a lista completa.", 8, GRAY)
+    return doc.to_bytes()
+
+
+class ReportCache:
+    """Relatórios renderizados por chave (versão, formato, filtros), gerados em um pool de threads"""
+
+    def __init__(self, workers=2, size=32, max_pending=8):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report')
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = size
+        self.max_pending = max_pending
+
+    def get(self, key, render):
+        """``Future`` do relatório; ``None`` se já há relatórios demais na fila.
+
+        Uma renderização com erro é descartada e refeita na próxima chamada.
+        """
+        with self._lock:
+            future = self._entries.get(key)
+            if future is None or (future.done() and future.exception() is not None):
+                pending = sum(1 for entry in self._entries.values() if not entry.done())
+                if pending >= self.max_pending:
+                    CACHE_REQUESTS.inc(cache='report', result='rejected')
+                    return None
+                CACHE_REQUESTS.inc(cache='report', result='miss')
+                future = self._executor.submit(render)
+                self._entries[key] = future
+            else:
+                CACHE_REQUESTS.inc(cache='report', result='hit')
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+            return future
+
+    def discard_older(self, version):
+        """Remove relatórios de versões anteriores (chamado a cada novo snapshot)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] != version]:
+                del self._entries[key]
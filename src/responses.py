@@ -0,0 +1,133 @@
+"""Respostas JSON pré-serializadas e comprimidas por snapshot.
+
+As respostas mais pedidas (filtros, agregados) são codificadas uma única vez
+quando o snapshot é carregado, junto com as versões gzip e brotli; a lista
+completa de registros, bem maior, só é montada na primeira requisição
+(``LazyPreparedResponse``). Cada uma tem um ETag forte derivado do conteúdo, então a mesma
+resposta tem o mesmo ETag em todos os workers, e um ``If-None-Match``
+coincidente recebe 304 sem corpo. As versões comprimidas têm ETags próprios
+(sufixo ``-gz``/``-br``), como exige um validador forte quando a codificação
+muda.
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+from flask import Response
+
+from metrics import CACHE_REQUESTS
+
+try:
+    import brotli
+except ImportError:  # está no requirements.txt; sem ele (instalação mínima), apenas gzip
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Sempre revalidar: a resposta pode mudar a cada recarga, mas o 304 é barato
+CACHE_CONTROL = 'no-cache'
+
+# Sufixo do ETag de cada codificação
+ETAG_SUFFIXES = {'gzip': '-gz', 'br': '-br'}
+
+
+def dump_json(payload):
+    """Mesmo formato do ``jsonify`` (chaves ordenadas, ASCII, compacto)"""
+    return json.dumps(payload, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class PreparedResponse:
+    """Corpo JSON já codificado, com versões comprimidas e ETag"""
+
+    __slots__ = ('body', 'etag', 'encoded')
+
+    def __init__(self, payload):
+        self.body = dump_json(payload)
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.encoded = {'gzip': gzip.compress(self.body, GZIP_LEVEL)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+
+    def send(self, request):
+        """Resposta para a requisição: 304, versão comprimida ou corpo original"""
+        encoding = negotiate_encoding(request, self.encoded)
+        etag = self.etag + ETAG_SUFFIXES[encoding] if encoding else self.etag
+        # Qualquer codificação do mesmo conteúdo vale como cópia atual (o cliente
+        # pode ter guardado a versão gzip e agora aceitar br)
+        if any(candidate in request.if_none_match for candidate in self.etags()):
+            CACHE_REQUESTS.inc(cache='prepared_response', result='not_modified')
+            response = Response(status=304)
+        else:
+            CACHE_REQUESTS.inc(cache='prepared_response', result='hit')
+            body = self.encoded[encoding] if encoding else self.body
+            response = Response(body, mimetype='application/json')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def etags(self):
+        """ETags do corpo original e de cada versão comprimida"""
+        return [self.etag] + [self.etag + ETAG_SUFFIXES[encoding] for encoding in self.encoded]
+
+
+class LazyPreparedResponse:
+    """``PreparedResponse`` montada na primeira requisição e guardada para as seguintes
+
+    Evita que cada worker serialize e comprima, a cada recarga, uma resposta
+    que ele talvez nunca sirva.
+    """
+
+    __slots__ = ('_factory', '_response', '_lock')
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._response = None
+        self._lock = threading.Lock()
+
+    def send(self, request):
+        response = self._response
+        if response is None:
+            with self._lock:
+                if self._response is None:
+                    CACHE_REQUESTS.inc(cache='prepared_response', result='miss')
+                    self._response = PreparedResponse(self._factory())
+                    self._factory = None
+                response = self._response
+        return response.send(request)
+
+
+def stream_json_list(chunks):
+    """Lista JSON (mesmo formato de ``dump_json``) a partir de blocos de itens, sem juntá-los"""
+    yield b'['
+    first = True
+    for items in chunks:
+        if not items:
+            continue
+        body = dump_json(items)[1:-1]
+        yield body if first else b',' + body
+        first = False
+    yield b']'
+
+
+def negotiate_encoding(request, available):
+    """Melhor codificação aceita pelo cliente entre as disponíveis (br > gzip)"""
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+def add_conditional_headers(request, response):
+    """ETag e 304 para respostas JSON dinâmicas (páginas filtradas, busca)"""
+    if (request.method != 'GET' or response.status_code != 200 or response.mimetype != 'application/json'
+            or response.get_etag()[0] is not None or response.is_streamed):
+        return response
+    response.add_etag()
+    response.headers.setdefault('Cache-Control', CACHE_CONTROL)
+    return response.make_conditional(request)
@@ -0,0 +1,303 @@
+"""Índice de busca por nome, cidade e endereço dos veículos.
+
+Os textos são normalizados (sem acentos, minúsculos) e quebrados em palavras.
+Cada palavra distinta do cadastro é indexada por trigramas, o que permite
+encontrar prefixos, trechos e pequenos erros de digitação consultando apenas
+o vocabulário, que é muito menor que o número de registros. Os registros de
+cada palavra ficam em arrays do numpy (formato CSR: todas as palavras num só
+array, ordenado por palavra), e uma busca só percorre os registros das
+palavras encontradas: o custo não depende do tamanho do cadastro.
+"""
+import bisect
+import re
+import unicodedata
+from array import array
+from itertools import islice
+
+import numpy as np
+
+from columnar import NAME_COLUMN
+
+# Peso de cada campo na pontuação
+SEARCH_FIELDS = {
+    NAME_COLUMN: 3.0,
+    'Cidade': 1.0,
+    'Endereço': 1.0,
+}
+
+# Similaridade mínima (Dice entre trigramas) para aceitar uma palavra com erro
+MIN_SIMILARITY = 0.45
+
+# Termos de 1-2 letras ("a", "po") expandem só para as primeiras palavras do
+# vocabulário com esse prefixo (a palavra exata vem primeiro na ordem)
+SHORT_TERM_LENGTH = 2
+MAX_SHORT_PREFIX_WORDS = 50
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+# Acentos decompostos pelo NFKD (a maior parte dos textos com acento); U+034F
+# fica de fora porque não é combinante para ``unicodedata.combining``
+ACCENTS = re.compile('[\u0300-\u034e\u0350-\u036f]+')
+
+
+def fold(text):
+    """Remove acentos e coloca em minúsculas ("Notícias" -> "noticias")"""
+    text = str(text)
+    if text.isascii():
+        return text.lower()
+    decomposed = ACCENTS.sub('', unicodedata.normalize('NFKD', text))
+    if not decomposed.isascii():
+        # Outros caracteres combinantes (raros): filtro caractere a caractere
+        decomposed = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return decomposed.casefold()
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(fold(text))
+
+
+def trigrams(word):
+    padded = f'${word}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Vocabulário com postings por trigrama e registros por palavra.
+
+    Os registros da palavra ``w`` são ``positions[offsets[w]:offsets[w + 1]]``,
+    com o peso do melhor campo em ``weights``. Com ``base`` (índice do snapshot
+    anterior) e ``changes`` estável (linhas antigas nas mesmas posições, novas
+    no fim), apenas as linhas novas e alteradas são tokenizadas; as estruturas
+    do índice anterior, que continua sendo usado por requisições em andamento,
+    não são alteradas.
+    """
+
+    def __init__(self, data, base=None, changes=None):
+        self.data = data
+        if base is None or changes is None or not changes.stable:
+            base, changes = None, None
+        if base is None:
+            self.words = []
+            self._word_ids = {}
+            # Quantidade de trigramas de cada palavra (para a similaridade)
+            self.word_gram_counts = array('l')
+            self.trigram_words = {}
+            # Vocabulário ordenado (para busca por prefixo) e o id de cada palavra
+            self.sorted_words = []
+            self.sorted_ids = array('l')
+            rows = None
+        else:
+            self.words = list(base.words)
+            self._word_ids = dict(base._word_ids)
+            self.word_gram_counts = array('l', base.word_gram_counts)
+            self.trigram_words = dict(base.trigram_words)
+            self.sorted_words = base.sorted_words
+            self.sorted_ids = base.sorted_ids
+            rows = np.concatenate([changes.changed, changes.added]).astype(np.int64)
+
+        new_words_start = len(self.words)
+        word_ids, positions, weights = self._row_postings(rows)
+        if base is not None:
+            # Linhas alteradas saem do índice anterior e entram de novo com as palavras atuais
+            removed = np.zeros(len(data), dtype=bool)
+            removed[changes.changed] = True
+            keep = ~removed[base.positions]
+            old_words = np.repeat(np.arange(len(base.offsets) - 1), np.diff(base.offsets))
+            word_ids = np.concatenate([old_words[keep], word_ids])
+            positions = np.concatenate([base.positions[keep], positions])
+            weights = np.concatenate([base.weights[keep], weights])
+            order = np.argsort(word_ids * len(data) + positions)
+            word_ids, positions, weights = word_ids[order], positions[order], weights[order]
+        self.positions = positions
+        self.weights = weights
+        self.offsets = np.zeros(len(self.words) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(word_ids, minlength=len(self.words)), out=self.offsets[1:])
+
+        copied_grams = set()
+        for word_id in range(new_words_start, len(self.words)):
+            grams = trigrams(self.words[word_id])
+            self.word_gram_counts.append(len(grams))
+            for gram in grams:
+                postings = self.trigram_words.get(gram)
+                if postings is None:
+                    self.trigram_words[gram] = array('l', (word_id,))
+                    continue
+                if base is not None and gram not in copied_grams:
+                    postings = self.trigram_words[gram] = array('l', postings)
+                    copied_grams.add(gram)
+                postings.append(word_id)
+
+        if len(self.words) > new_words_start:
+            # A ordem anterior já vem ordenada: o timsort só intercala as palavras novas
+            order = sorted(list(self.sorted_ids) + list(range(new_words_start, len(self.words))),
+                           key=self.words.__getitem__)
+            self.sorted_words = [self.words[word_id] for word_id in order]
+            self.sorted_ids = array('l', order)
+
+    def _word_id(self, word):
+        word_id = self._word_ids.get(word)
+        if word_id is None:
+            word_id = self._word_ids[word] = len(self.words)
+            self.words.append(word)
+        return word_id
+
+    def _row_postings(self, rows=None):
+        """``(palavras, posições, pesos)`` das linhas ``rows`` (todas se ``None``), ordenados
+        por palavra e posição, com o peso do melhor campo de cada par"""
+        all_rows = np.arange(len(self.data), dtype=np.int64) if rows is None else rows
+        # Campos do maior para o menor peso: o posto entra na chave de ordenação
+        fields = sorted(SEARCH_FIELDS.items(), key=lambda item: -item[1])
+        key_parts = []
+        for rank, (field, weight) in enumerate(fields):
+            if field == NAME_COLUMN:
+                # Arrays do módulo array: sem um objeto Python por entrada
+                word_ids, positions = array('q'), array('q')
+                names = self.data.names
+                lookup = self._word_ids
+                for position in all_rows.tolist():
+                    for word in tokenize(names[position]):
+                        word_id = lookup.get(word)
+                        word_ids.append(self._word_id(word) if word_id is None else word_id)
+                        positions.append(position)
+                word_ids = np.frombuffer(word_ids, dtype=np.int64) if word_ids else np.empty(0, np.int64)
+                positions = np.frombuffer(positions, dtype=np.int64) if positions else np.empty(0, np.int64)
+            else:
+                # Cada categoria é tokenizada uma única vez e repetida nas suas linhas
+                categorical = self.data.categoricals[field]
+                category_words = [[] if category == 'N/A' else [self._word_id(word) for word in tokenize(category)]
+                                  for category in categorical.categories]
+                lengths = np.array([len(words) for words in category_words], dtype=np.int64)
+                flat = np.array([word_id for words in category_words for word_id in words], dtype=np.int64)
+                codes = categorical.codes[all_rows]
+                counts = lengths[codes]
+                positions = np.repeat(all_rows, counts)
+                # Índice de cada entrada dentro das palavras da sua categoria
+                within = np.arange(len(positions)) - np.repeat(np.cumsum(counts) - counts, counts)
+                word_ids = flat[np.repeat(np.cumsum(lengths)[codes] - counts, counts) + within]
+            key_parts.append((word_ids * len(self.data) + positions) * len(fields) + rank)
+        # Uma única chave inteira ordena por palavra, posição e peso (o maior primeiro)
+        keys = np.sort(np.concatenate(key_parts))
+        pairs = keys // len(fields)
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = pairs[1:] != pairs[:-1]
+        keys, pairs = keys[first], pairs[first]
+        weights = np.array([weight for _, weight in fields], dtype=np.float32)[keys % len(fields)]
+        return pairs // max(len(self.data), 1), (pairs % max(len(self.data), 1)).astype(np.int32), weights
+
+    def _prefix_matches(self, term):
+        sorted_words = self.sorted_words
+        # islice() percorreria a lista desde o início; o índice começa direto no prefixo
+        for i in range(bisect.bisect_left(sorted_words, term), len(sorted_words)):
+            if not sorted_words[i].startswith(term):
+                break
+            yield self.sorted_ids[i]
+
+    def _similar_words(self, term):
+        """Palavras do vocabulário parecidas com o termo e sua similaridade (0 a 1)"""
+        prefixed = self._prefix_matches(term)
+        if len(term) <= SHORT_TERM_LENGTH:
+            prefixed = islice(prefixed, MAX_SHORT_PREFIX_WORDS)
+        matches = {word_id: (1.0 if self.words[word_id] == term else 0.9) for word_id in prefixed}
+        if len(term) < 3:
+            return matches
+
+        term_grams = trigrams(term)
+        shared = {}
+        for gram in term_grams:
+            for word_id in self.trigram_words.get(gram, ()):
+                shared[word_id] = shared.get(word_id, 0) + 1
+        for word_id, count in shared.items():
+            if word_id in matches:
+                continue
+            if term in self.words[word_id]:
+                matches[word_id] = 0.8
+                continue
+            similarity = 2 * count / (len(term_grams) + self.word_gram_counts[word_id])
+            if similarity >= MIN_SIMILARITY:
+                matches[word_id] = similarity * 0.7
+        return matches
+
+    def _term_scores(self, term):
+        """Registros com alguma palavra parecida com o termo e a melhor pontuação de cada um"""
+        position_parts, score_parts = [], []
+        for word_id, similarity in self._similar_words(term).items():
+            start, end = self.offsets[word_id], self.offsets[word_id + 1]
+            if start < end:
+                position_parts.append(self.positions[start:end])
+                score_parts.append(self.weights[start:end].astype(np.float64) * similarity)
+        if not position_parts:
+            return np.empty(0, np.int32), np.empty(0)
+        if len(position_parts) == 1:
+            return position_parts[0], score_parts[0]
+        positions = np.concatenate(position_parts)
+        scores = np.concatenate(score_parts)
+        order = np.lexsort((-scores, positions))
+        positions, scores = positions[order], scores[order]
+        first = np.ones(len(positions), dtype=bool)
+        first[1:] = positions[1:] != positions[:-1]
+        return positions[first], scores[first]
+
+    def search(self, query, limit=None, positions=None):
+        """Posições dos registros ordenadas por relevância.
+
+        Registros que atendem a todas as palavras da busca vêm primeiro.
+        ``positions`` (máscara booleana) restringe a busca a um subconjunto (ex.: filtros).
+        """
+        terms = tokenize(query)
+        if not terms or (limit is not None and limit <= 0):
+            return []
+
+        matches = [self._term_scores(term) for term in terms]
+        if len(terms) == 1:
+            candidates, scores = matches[0]
+            matched_terms = np.ones(len(candidates), dtype=np.int64)
+        else:
+            # Soma das pontuações e número de termos atendidos por registro
+            candidates, inverse = np.unique(np.concatenate([found for found, _ in matches]), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate([score for _, score in matches]),
+                                 minlength=len(candidates))
+            matched_terms = np.bincount(inverse, minlength=len(candidates))
+
+        if positions is not None:
+            keep = np.asarray(positions, dtype=bool)[candidates]
+            candidates, scores, matched_terms = candidates[keep], scores[keep], matched_terms[keep]
+        if len(terms) > 1:
+            full = matched_terms == len(terms)
+            if full.any():
+                candidates, scores, matched_terms = candidates[full], scores[full], matched_terms[full]
+        if len(candidates) == 0:
+            return []
+        if limit is not None and len(candidates) > limit:
+            # Só os ``limit`` melhores são ordenados; empates no corte entram todos
+            composite = matched_terms * (scores.max() + 1) + scores
+            cut = np.partition(composite, len(candidates) - limit)[len(candidates) - limit]
+            top = composite >= cut
+            candidates, scores, matched_terms = candidates[top], scores[top], matched_terms[top]
+        order = np.lexsort((candidates, -scores, -matched_terms))
+        ranked = candidates[order]
+        return (ranked[:limit] if limit is not None else ranked).tolist()
+
+    def suggest(self, query, limit=8):
+        """Nomes de veículos para autocompletar a busca"""
+        # Nomes repetidos são raros: primeiro só os melhores, a lista inteira se faltar
+        ranked = self.search(query, limit * 8)
+        if len(ranked) == limit * 8:
+            ranked = self._distinct_names(ranked, limit)
+            if len(ranked) < limit:
+                ranked = self.search(query)
+        return [str(self.data.names[position]).strip() for position in self._distinct_names(ranked, limit)]
+
+    def _distinct_names(self, ranked, limit):
+        """Primeiras posições com nomes distintos (sem acento/caixa), até ``limit``"""
+        selected = []
+        seen = set()
+        for position in ranked:
+            name = str(self.data.names[position]).strip()
+            key = fold(name)
+            if name and key not in seen:
+                seen.add(key)
+                selected.append(position)
+                if len(selected) >= limit:
+                    break
+        return selected
@@ -0,0 +1,302 @@
+"""Download das exportações CSV do Google Sheets.
+
+Mantém uma ``requests.Session`` com pool de conexões, envia requisições
+condicionais (ETag/Last-Modified) e compara o hash do conteúdo com a última
+versão aceita, para que uma planilha sem alterações não seja processada de
+novo. Também registra taxa de sucesso e latência de cada URL e as ordena para
+que o espelho mais rápido que está funcionando seja tentado primeiro.
+
+``race`` dispara as URLs em paralelo, cada uma um pouco depois da anterior
+(hedging), e fica com o primeiro CSV válido. O prazo total vale só para os
+downloads: a conversão da resposta vencedora, que cresce com o tamanho da
+planilha, fica fora dele. URLs com falhas seguidas têm o circuito aberto e
+ficam de fora por um tempo.
+"""
+import hashlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LOADER_STAGE, SHEETS_FETCH
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Peso da última medição na média móvel de latência
+LATENCY_SMOOTHING = 0.3
+
+# Falhas seguidas que abrem o circuito de uma URL e pausa inicial (dobra a cada
+# nova falha após a reabertura, até o máximo)
+CIRCUIT_THRESHOLD = 3
+CIRCUIT_COOLDOWN = 60
+CIRCUIT_MAX_COOLDOWN = 900
+
+
+class FetchResult:
+    """Resultado do download de uma URL"""
+
+    def __init__(self, url, text, digest, not_modified, latency, etag=None, last_modified=None):
+        self.url = url
+        self.text = text
+        self.digest = digest
+        self.not_modified = not_modified
+        self.latency = latency
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class UrlStats:
+    """Histórico de sucesso e latência de uma URL"""
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.latency = None
+        self.last_error = None
+        self.consecutive_failures = 0
+        self.open_until = None
+
+    @property
+    def attempts(self):
+        return self.successes + self.failures
+
+    def success_rate(self):
+        return self.successes / self.attempts if self.attempts else None
+
+    def record(self, success, latency=None, error=None):
+        if success:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.open_until = None
+        else:
+            self.failures += 1
+            self.last_error = error
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= CIRCUIT_THRESHOLD:
+                cooldown = CIRCUIT_COOLDOWN * 2 ** (self.consecutive_failures - CIRCUIT_THRESHOLD)
+                self.open_until = time.monotonic() + min(cooldown, CIRCUIT_MAX_COOLDOWN)
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+    def is_open(self):
+        """Circuito aberto: a URL falhou seguidamente e ainda está em pausa"""
+        return self.open_until is not None and time.monotonic() < self.open_until
+
+    def expected_cost(self, timeout):
+        """Tempo esperado até obter uma resposta válida desta URL"""
+        if not self.attempts:
+            return timeout
+        latency = self.latency if self.latency is not None else timeout
+        return latency + (1 - self.success_rate()) * timeout
+
+    def to_dict(self):
+        rate = self.success_rate()
+        return {
+            'successes': self.successes,
+            'failures': self.failures,
+            'success_rate': round(rate, 3) if rate is not None else None,
+            'latency_seconds': round(self.latency, 3) if self.latency is not None else None,
+            'last_error': self.last_error,
+            'consecutive_failures': self.consecutive_failures,
+            'circuit_open': self.is_open(),
+        }
+
+
+class SheetsFetcher:
+    """Busca a planilha nas URLs configuradas com requisições condicionais"""
+
+    def __init__(self, urls, timeout=15, headers=None):
+        self.urls = list(urls)
+        self.timeout = timeout
+        self.headers = headers or DEFAULT_HEADERS
+        self.session = self._new_session()
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._validators = {}
+        self._accepted_digest = None
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.urls) or 1, pool_maxsize=4)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(self.headers)
+        return session
+
+    def reset_session(self):
+        """Abre uma sessão nova (após o fork, as conexões do processo pai não podem ser reusadas)"""
+        self.session = self._new_session()
+
+    def _url_stats(self, url):
+        if url not in self._stats:
+            self._stats[url] = UrlStats()
+        return self._stats[url]
+
+    def ranked_urls(self):
+        """URLs ordenadas pelo custo esperado (as não testadas mantêm a ordem original)"""
+        with self._lock:
+            position = {url: i for i, url in enumerate(self.urls)}
+            return sorted(self.urls, key=lambda url: (self._url_stats(url).expected_cost(self.timeout), position[url]))
+
+    def available_urls(self):
+        """URLs ranqueadas, sem as que estão com o circuito aberto"""
+        ranked = self.ranked_urls()
+        with self._lock:
+            return [url for url in ranked if not self._url_stats(url).is_open()]
+
+    def fetch(self, url, timeout=None):
+        """Baixa a URL; ``not_modified`` indica que o conteúdo é o último aceito.
+
+        Erros de rede e respostas diferentes de 200/304 são registrados como
+        falha e levantam ``requests.RequestException``. O chamador deve
+        confirmar o resultado com ``accept`` ou ``record_failure`` depois de
+        validar o CSV.
+        """
+        with self._lock:
+            validators = self._validators.get(url, {})
+        conditional = {}
+        if validators.get('etag'):
+            conditional['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            conditional['If-Modified-Since'] = validators['last_modified']
+
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, timeout=timeout or self.timeout, headers=conditional,
+                                        allow_redirects=True)
+        except requests.RequestException as e:
+            self.record_failure(url, str(e), time.monotonic() - start)
+            SHEETS_FETCH.observe(time.monotonic() - start, url=url, result='error')
+            raise
+        latency = time.monotonic() - start
+
+        if response.status_code == 304 and validators:
+            SHEETS_FETCH.observe(latency, url=url, result='not_modified')
+            return FetchResult(url, None, validators['digest'], True, latency)
+
+        if response.status_code != 200:
+            self.record_failure(url, f'HTTP {response.status_code}', latency)
+            SHEETS_FETCH.observe(latency, url=url, result=f'http_{response.status_code}')
+            raise requests.HTTPError(f'HTTP {response.status_code}', response=response)
+        SHEETS_FETCH.observe(latency, url=url, result='ok')
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        with self._lock:
+            not_modified = digest == self._accepted_digest
+        return FetchResult(url, response.text, digest, not_modified, latency,
+                           response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    def race(self, parse, hedge_delay=2.0, deadline=20.0, validate=None):
+        """Busca as URLs em paralelo e retorna ``(resultado, parse(resultado))`` do primeiro válido.
+
+        A URL mais bem ranqueada começa na hora; cada uma das seguintes começa
+        ``hedge_delay`` segundos depois da anterior, ou assim que uma tentativa
+        falha. ``validate`` (opcional, barato) descarta respostas inválidas
+        ainda na corrida levantando ``ValueError`` (ex.: corpo vazio ou HTML).
+        ``parse`` converte só a resposta vencedora, fora do prazo, e também
+        pode levantar ``ValueError``: a corrida continua com as outras URLs.
+        Nenhum dos dois é chamado quando o conteúdo não mudou (o segundo item
+        é ``None``). Retorna ``None`` se nenhuma URL responder dentro de
+        ``deadline`` segundos de download. Downloads ainda em andamento são
+        abandonados e terminam sozinhos, limitados ao tempo restante do prazo.
+        """
+        pending_urls = self.available_urls()
+        if not pending_urls:
+            print("Todas as URLs do Google Sheets estão com o circuito aberto")
+            return None
+
+        def attempt(url, timeout):
+            print(f"Tentando carregar dados do Google Sheets: {url}")
+            result = self.fetch(url, timeout)
+            if not result.not_modified and validate is not None:
+                try:
+                    validate(result)
+                except ValueError as e:
+                    self.record_failure(url, str(e), result.latency)
+                    raise
+            return result
+
+        start = time.monotonic()
+        # Tempo gasto convertendo respostas, descontado do prazo
+        parsing = 0.0
+        executor = ThreadPoolExecutor(max_workers=len(pending_urls), thread_name_prefix='sheets-fetch')
+        running = {}
+        next_launch = start
+        try:
+            while pending_urls or running:
+                now = time.monotonic()
+                remaining = start + parsing + deadline - now
+                if remaining <= 0:
+                    print(f"Prazo de {deadline:.0f}s esgotado buscando o Google Sheets")
+                    return None
+                if pending_urls and (now >= next_launch or not running):
+                    url = pending_urls.pop(0)
+                    running[executor.submit(attempt, url, min(self.timeout, remaining))] = url
+                    next_launch = now + hedge_delay
+                    continue
+
+                wait_for = remaining if not pending_urls else min(remaining, next_launch - now)
+                done, _ = wait(running, timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = running.pop(future)
+                    try:
+                        result = future.result()
+                        parsed = None
+                        if not result.not_modified:
+                            parse_start = time.monotonic()
+                            try:
+                                parsed = parse(result)
+                            except ValueError as e:
+                                self.record_failure(url, str(e), result.latency)
+                                raise
+                            finally:
+                                parsing += time.monotonic() - parse_start
+                    except Exception as e:
+                        print(f"Erro ao carregar dados do Google Sheets ({url}): {e}")
+                        # Falhou: a próxima URL não precisa esperar o hedge
+                        next_launch = time.monotonic()
+                        continue
+                    self.accept(result)
+                    return result, parsed
+            return None
+        finally:
+            LOADER_STAGE.observe(time.monotonic() - start - parsing, stage='fetch')
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def accept(self, result):
+        """Registra o sucesso da URL e guarda o conteúdo como a versão atual"""
+        with self._lock:
+            self._url_stats(result.url).record(True, result.latency)
+            if result.digest != self._accepted_digest:
+                # Validadores das outras URLs se referem a um conteúdo antigo
+                self._validators = {}
+                self._accepted_digest = result.digest
+            if result.etag or result.last_modified:
+                self._validators[result.url] = {
+                    'etag': result.etag,
+                    'last_modified': result.last_modified,
+                    'digest': result.digest,
+                }
+
+    def record_failure(self, url, error, latency=None):
+        """Conta uma falha (rede, HTML de erro, CSV vazio) para a URL"""
+        with self._lock:
+            self._url_stats(url).record(False, latency, error)
+            self._validators.pop(url, None)
+
+    def forget(self):
+        """Descarta a versão aceita (ex.: após cair no CSV local)"""
+        with self._lock:
+            self._accepted_digest = None
+            self._validators = {}
+
+    def stats(self):
+        with self._lock:
+            return {url: self._url_stats(url).to_dict() for url in self.urls}
@@ -0,0 +1,364 @@
+"""Cache dos dados da planilha com atualização em segundo plano.
+
+O snapshot atual é sempre servido imediatamente; quando fica velho, uma única
+recarga é disparada em uma thread separada (stale-while-revalidate).
+
+Cada carga é gravada em um arquivo local (ver ``snapshot_store``). No boot esse
+arquivo é lido, mesmo que antigo, e servido em milissegundos enquanto a fonte é
+consultada em segundo plano. Com vários workers do gunicorn, o mesmo arquivo e
+um lock de arquivo garantem que apenas um processo busque os dados no Google
+por vez.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import snapshot_store
+from changes import diff_data
+from metrics import CACHE_REQUESTS, LOADER_STAGE, SNAPSHOT_BUILD, SNAPSHOT_RELOADS
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+
+class Snapshot:
+    """Conjunto de dados carregado em um determinado momento"""
+
+    def __init__(self, data, source, loaded_at, load_duration, version, checked_at=None):
+        self.data = data
+        self.source = source
+        self.loaded_at = loaded_at
+        self.load_duration = load_duration
+        self.version = version
+        self.checked_at = checked_at or loaded_at
+        # Estruturas derivadas (agregados, índices) construídas na instalação
+        self.derived = {}
+        # Diferença para o snapshot anterior (``ChangeSet``) e o próprio anterior,
+        # disponível para os builders apenas durante a instalação
+        self.changes = None
+        self.previous = None
+
+    def age(self):
+        """Idade do snapshot em segundos"""
+        return (datetime.now() - self.loaded_at).total_seconds()
+
+    def since_check(self):
+        """Segundos desde a última verificação da fonte (com ou sem alterações)"""
+        return (datetime.now() - self.checked_at).total_seconds()
+
+
+class SnapshotCache:
+    """Mantém o último snapshot válido e o recarrega periodicamente.
+
+    ``loader`` recebe o snapshot atual (ou ``None``) e retorna ``(data, source)``,
+    ou ``None`` quando o snapshot atual deve ser mantido (ex.: fonte sem alterações).
+    ``path`` é o arquivo onde cada snapshot é persistido; sem ele, nada é gravado.
+    """
+
+    def __init__(self, loader, refresh_interval=300, path=None):
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self.path = path
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self._restore_lock = threading.Lock()
+        self._scheduler = None
+        self._scheduler_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._builders = {}
+        self._listeners = []
+        self.last_error = None
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def register(self, name, builder):
+        """Registra uma estrutura derivada, construída a cada novo snapshot.
+
+        ``builder`` recebe o snapshot; o resultado fica em
+        ``snapshot.derived[name]`` antes de o snapshot passar a ser servido.
+        As estruturas são construídas na ordem de registro, então um builder
+        pode usar as registradas antes dele.
+        """
+        self._builders[name] = builder
+        snapshot = self._snapshot
+        if snapshot is not None:
+            snapshot.derived[name] = builder(snapshot)
+
+    def add_listener(self, callback):
+        """``callback(snapshot, previous)`` é chamado sempre que um novo snapshot passa a ser servido"""
+        self._listeners.append(callback)
+
+    def is_refreshing(self, shared=False):
+        """Se há uma recarga neste processo (ou, com ``shared``, em qualquer worker)"""
+        return self._reload_lock.locked() or (shared and self._file_locked())
+
+    def since_check(self):
+        """Segundos desde a última verificação da fonte por qualquer worker (``None`` sem snapshot)"""
+        snapshot = self._snapshot
+        ages = [] if snapshot is None else [snapshot.since_check()]
+        metadata = snapshot_store.read_metadata(self.path) if self.path else None
+        if metadata is not None:
+            ages.append((datetime.now() - metadata['checked_at']).total_seconds())
+        return min(ages) if ages else None
+
+    def get(self):
+        """Retorna o snapshot atual sem bloquear, exceto na primeira carga sem arquivo salvo"""
+        self.start()
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.restore()
+            if snapshot is None:
+                CACHE_REQUESTS.inc(cache='snapshot', result='miss')
+                return self.refresh(wait=True)
+        if snapshot.since_check() > self.refresh_interval:
+            CACHE_REQUESTS.inc(cache='snapshot', result='stale')
+            self.refresh_async()
+        else:
+            CACHE_REQUESTS.inc(cache='snapshot', result='hit')
+        return snapshot
+
+    def preload(self):
+        """Carrega o snapshot sem iniciar threads (processo mestre, antes do fork dos workers).
+
+        Usa o arquivo salvo se existir, mesmo antigo; os workers o atualizam em
+        segundo plano. Só busca na fonte quando não há arquivo.
+        """
+        return self.restore() or self.refresh(wait=True)
+
+    def restore(self):
+        """Adota o snapshot salvo em disco, qualquer que seja a idade (boot)"""
+        with self._restore_lock:
+            if self._snapshot is None and self.path:
+                snapshot = self._read_stored()
+                if snapshot is not None:
+                    self._install(snapshot)
+                    SNAPSHOT_RELOADS.inc(result='restored')
+                    print(f"Snapshot {snapshot.version} restaurado de {self.path} "
+                          f"({snapshot.source}, {len(snapshot.data)} registros, {snapshot.age():.0f}s de idade)")
+            return self._snapshot
+
+    def refresh(self, wait=True, force=False, min_interval=None):
+        """Recarrega os dados; apenas uma recarga roda por vez.
+
+        Se outra recarga já estiver em andamento, espera por ela (``wait``) ou
+        retorna imediatamente o snapshot atual. ``force`` ignora o intervalo de
+        atualização, mas com ``min_interval`` ainda adota o snapshot salvo se
+        outro worker verificou a fonte há menos de ``min_interval`` segundos.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            if wait:
+                with self._reload_lock:
+                    pass
+            return self._snapshot
+        try:
+            return self._reload(force, min_interval)
+        except Exception as e:
+            self.last_error = str(e)
+            SNAPSHOT_RELOADS.inc(result='error')
+            print(f"Erro ao recarregar dados: {e}")
+            return self._snapshot
+        finally:
+            self._reload_lock.release()
+
+    def refresh_async(self, force=False, min_interval=None):
+        """Dispara uma recarga em segundo plano se nenhuma estiver rodando"""
+        if self.is_refreshing():
+            return
+        threading.Thread(target=self.refresh, kwargs={'wait': False, 'force': force, 'min_interval': min_interval},
+                         name='snapshot-refresh', daemon=True).start()
+
+    def adopt_async(self):
+        """Adota em segundo plano o snapshot salvo se outro worker gravou uma versão mais nova"""
+        current = self._snapshot
+        metadata = snapshot_store.read_metadata(self.path) if self.path else None
+        if current is None or metadata is None or metadata['version'] <= current.version or self.is_refreshing():
+            return
+        threading.Thread(target=self._adopt_newer, name='snapshot-adopt', daemon=True).start()
+
+    def _adopt_newer(self):
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            # Qualquer idade: a versão salva é mais nova que a servida
+            self._adopt_stored(float('inf'))
+        except Exception as e:
+            print(f"Erro ao adotar o snapshot salvo: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def start(self):
+        """Inicia (uma única vez) a thread de atualização periódica"""
+        if self._scheduler is not None:
+            return
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._run_scheduler,
+                                                   name='snapshot-scheduler', daemon=True)
+                self._scheduler.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_scheduler(self):
+        while True:
+            snapshot = self._snapshot
+            delay = self.refresh_interval if snapshot is None else self.refresh_interval - snapshot.since_check()
+            if self._stop.wait(max(1.0, delay)):
+                return
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.since_check() >= self.refresh_interval:
+                self.refresh(wait=False)
+
+    def _reload(self, force, min_interval=None):
+        # Idade máxima da verificação de outro worker para adotar o arquivo em vez de buscar
+        max_age = min_interval if force else self.refresh_interval
+        if max_age:
+            shared = self._adopt_stored(max_age)
+            if shared is not None:
+                return shared
+
+        with self._file_lock():
+            # Outro worker pode ter terminado a carga enquanto esperávamos o lock
+            if max_age:
+                shared = self._adopt_stored(max_age)
+                if shared is not None:
+                    return shared
+
+            start = time.monotonic()
+            current = self._snapshot
+            with LOADER_STAGE.time(stage='total'):
+                result = self._loader(current)
+            duration = time.monotonic() - start
+            if result is None and current is not None:
+                # Nada a trocar: mantém o mesmo objeto de snapshot
+                current.checked_at = datetime.now()
+                self._persist(snapshot_store.touch_snapshot, current)
+                SNAPSHOT_RELOADS.inc(result='unchanged')
+                print(f"Snapshot {current.version} mantido ({duration:.2f}s)")
+                return current
+            if result is None:
+                raise RuntimeError('Carregador indicou dados inalterados sem snapshot atual')
+            data, source = result
+            changes = self._diff(current.data, data) if current is not None else None
+            if changes is not None and not changes and source == current.source:
+                # Conteúdo baixado de novo, mas nenhuma linha da API mudou
+                current.checked_at = datetime.now()
+                self._persist(snapshot_store.touch_snapshot, current)
+                SNAPSHOT_RELOADS.inc(result='unchanged')
+                print(f"Snapshot {current.version} mantido (nenhuma linha alterada, {duration:.2f}s)")
+                return current
+            snapshot = Snapshot(data, source, datetime.now(), duration, int(time.time() * 1000))
+            snapshot.changes = changes
+            self._install(snapshot)
+            self._persist(snapshot_store.write_snapshot, snapshot)
+            self.last_error = None
+            SNAPSHOT_RELOADS.inc(result='loaded')
+            print(f"Snapshot {snapshot.version} carregado ({source}, {len(data)} registros, {duration:.2f}s)")
+            return snapshot
+
+    def _install(self, snapshot):
+        previous = self._snapshot
+        if previous is not None and snapshot.changes is None:
+            snapshot.changes = self._diff(previous.data, snapshot.data)
+        snapshot.previous = previous
+        try:
+            for name, builder in self._builders.items():
+                if name not in snapshot.derived:
+                    with SNAPSHOT_BUILD.time(builder=name):
+                        snapshot.derived[name] = builder(snapshot)
+        finally:
+            # Não manter a cadeia de snapshots antigos em memória
+            snapshot.previous = None
+        self._snapshot = snapshot
+        if previous is not None:
+            print(f"Snapshot {snapshot.version}: {snapshot.changes.summary()}")
+        for listener in self._listeners:
+            listener(snapshot, previous)
+        return snapshot
+
+    @staticmethod
+    def _diff(old, new):
+        with LOADER_STAGE.time(stage='diff'):
+            return diff_data(old, new)
+
+    def _read_stored(self):
+        try:
+            stored = snapshot_store.read_snapshot(self.path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Snapshot salvo inválido ({self.path}): {e}")
+            return None
+        if stored is None:
+            return None
+        metadata, data = stored
+        return Snapshot(data, metadata['source'], metadata['loaded_at'], metadata['load_duration'],
+                        metadata['version'], metadata['checked_at'])
+
+    def _adopt_stored(self, max_age):
+        """Adota o snapshot do arquivo se verificado há menos de ``max_age`` segundos (por outro worker)"""
+        if not self.path:
+            return None
+        # Só os metadados: os dados são lidos apenas se a versão for nova
+        metadata = snapshot_store.read_metadata(self.path)
+        if metadata is None or (datetime.now() - metadata['checked_at']).total_seconds() >= max_age:
+            return None
+        current = self._snapshot
+        if current is not None and current.version == metadata['version']:
+            current.checked_at = max(current.checked_at, metadata['checked_at'])
+            return current
+        if current is not None and current.version > metadata['version']:
+            return None
+        stored = self._read_stored()
+        if stored is None:
+            return None
+        SNAPSHOT_RELOADS.inc(result='adopted')
+        return self._install(stored)
+
+    def _persist(self, write, snapshot):
+        if not self.path:
+            return
+        try:
+            with LOADER_STAGE.time(stage='persist'):
+                write(self.path, snapshot)
+        except OSError as e:
+            print(f"Erro ao gravar snapshot em {self.path}: {e}")
+
+    def _file_locked(self):
+        """Se algum processo está com o lock do arquivo (recarga em andamento)"""
+        if not self.path or fcntl is None:
+            return False
+        try:
+            lock_file = open(self.path + '.lock', 'a')
+        except OSError:
+            return False
+        with lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+
+    @contextmanager
+    def _file_lock(self):
+        """Lock entre processos para que só um worker busque no Google por vez"""
+        if not self.path or fcntl is None:
+            yield
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            lock_file = open(self.path + '.lock', 'a')
+        except OSError:  # diretório somente leitura: segue sem lock
+            yield
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,162 @@
+"""Arquivo local versionado com o último snapshot carregado.
+
+Formato (little-endian)::
+
+    MAGIC (8 bytes) | tamanho dos metadados (u32) | tamanho do layout (u64)
+    metadados JSON  | layout JSON (nomes, chaves, categorias, colunas extras, posição dos arrays)
+    arrays NumPy alinhados em 8 bytes
+
+Os metadados (versão, fonte, horários) podem ser lidos sem tocar no resto do
+arquivo. Na leitura completa, os arrays são mapeados em memória com ``mmap``:
+nada é copiado, e todos os workers que abrem o mesmo arquivo compartilham as
+mesmas páginas do cache do sistema operacional.
+
+A gravação é atômica (arquivo temporário + ``os.replace``). Verificações sem
+alteração atualizam só um arquivo auxiliar ``.checked``.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from columnar import Categorical, ColumnarData, Numeric
+
+# Muda quando as colunas ou o layout mudam: arquivos antigos são ignorados
+MAGIC = b'MVSNAP03'
+PREFIX = struct.Struct('<8sIQ')
+ALIGNMENT = 8
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _metadata(snapshot):
+    return {
+        'version': snapshot.version,
+        'source': snapshot.source,
+        'loaded_at': snapshot.loaded_at.isoformat(),
+        'checked_at': snapshot.checked_at.isoformat(),
+        'load_duration': snapshot.load_duration,
+        'rows': len(snapshot.data),
+    }
+
+
+def write_snapshot(path, snapshot):
+    """Grava o snapshot de forma atômica"""
+    data = snapshot.data
+    arrays = []
+    layout = {'names': data.names, 'keys': data.keys, 'categoricals': {}, 'numerics': {}, 'extras': {}, 'arrays': {}}
+    for column, categorical in data.categoricals.items():
+        layout['categoricals'][column] = categorical.categories
+        arrays.append((f'codes:{column}', categorical.codes))
+    for column, numeric in data.numerics.items():
+        layout['numerics'][column] = True
+        arrays.append((f'values:{column}', numeric.values))
+        arrays.append((f'missing:{column}', numeric.missing.view(np.uint8)))
+    for column, categorical in data.extras.items():
+        layout['extras'][column] = categorical.categories
+        arrays.append((f'extra:{column}', categorical.codes))
+
+    offset = 0
+    for key, array in arrays:
+        offset = _align(offset)
+        layout['arrays'][key] = {'offset': offset, 'dtype': array.dtype.str, 'count': len(array)}
+        offset += array.nbytes
+
+    meta_bytes = json.dumps(_metadata(snapshot), ensure_ascii=False).encode('utf-8')
+    layout_bytes = json.dumps(layout, ensure_ascii=False).encode('utf-8')
+    header_size = PREFIX.size + len(meta_bytes) + len(layout_bytes)
+    data_start = _align(header_size)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(PREFIX.pack(MAGIC, len(meta_bytes), len(layout_bytes)))
+            file.write(meta_bytes)
+            file.write(layout_bytes)
+            file.write(b'\0' * (data_start - header_size))
+            for key, array in arrays:
+                position = data_start + layout['arrays'][key]['offset']
+                file.write(b'\0' * (position - file.tell()))
+                file.write(np.ascontiguousarray(array).tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _remove_quietly(path + '.checked')
+
+
+def touch_snapshot(path, snapshot):
+    """Registra uma verificação sem alterações (sem regravar os dados)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.checked-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump({'version': snapshot.version, 'checked_at': snapshot.checked_at.isoformat()}, file)
+    os.replace(tmp_path, path + '.checked')
+
+
+def read_metadata(path):
+    """Metadados do arquivo (sem ler os dados); ``None`` se não existir ou for inválido"""
+    try:
+        with open(path, 'rb') as file:
+            magic, meta_size, _ = PREFIX.unpack(file.read(PREFIX.size))
+            if magic != MAGIC:
+                return None
+            metadata = json.loads(file.read(meta_size).decode('utf-8'))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    metadata['loaded_at'] = datetime.fromisoformat(metadata['loaded_at'])
+    metadata['checked_at'] = datetime.fromisoformat(metadata['checked_at'])
+    try:
+        with open(path + '.checked', 'r', encoding='utf-8') as file:
+            checked = json.load(file)
+        if checked['version'] == metadata['version']:
+            metadata['checked_at'] = max(metadata['checked_at'], datetime.fromisoformat(checked['checked_at']))
+    except (OSError, ValueError, KeyError):
+        pass
+    return metadata
+
+
+def read_snapshot(path):
+    """Retorna ``(metadados, ColumnarData)`` com os arrays mapeados em memória"""
+    metadata = read_metadata(path)
+    if metadata is None:
+        return None
+    with open(path, 'rb') as file:
+        _, meta_size, layout_size = PREFIX.unpack(file.read(PREFIX.size))
+        file.seek(meta_size, os.SEEK_CUR)
+        layout = json.loads(file.read(layout_size).decode('utf-8'))
+        data_start = _align(PREFIX.size + meta_size + layout_size)
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if layout['arrays'] else b''
+
+    def array(key):
+        entry = layout['arrays'][key]
+        return np.frombuffer(buffer, dtype=np.dtype(entry['dtype']), count=entry['count'],
+                             offset=data_start + entry['offset'])
+
+    categoricals = {column: Categorical(array(f'codes:{column}'), [sys.intern(c) for c in categories])
+                    for column, categories in layout['categoricals'].items()}
+    numerics = {column: Numeric(array(f'values:{column}'), array(f'missing:{column}').view(bool))
+                for column in layout['numerics']}
+    extras = {column: Categorical(array(f'extra:{column}'), categories)
+              for column, categories in layout['extras'].items()}
+    return metadata, ColumnarData(layout['names'], categoricals, numerics, layout.get('keys'), extras)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass